@@ -0,0 +1,63 @@
+from problem import ProblemInstance, loadProblem
+from context import SolverContext
+from evolve import evolution
+from islands import islandEvolution
+from trajectory import trajectorySearch
+from warmstart import warmStart
+import concurrent.futures
+import multiprocessing
+
+
+# Every run gets a SolverContext of its own with the instance, the constraint
+# weights, the evolution constants, the caches and the random stream, so any
+# number of instances and configs can be solved in the calling process.
+
+
+def createContext(problem='./data', config=None, weights=None, seed=None):
+    # problem: a data directory or a ProblemInstance, config: evolution
+    # constants replacing the ones of the instance, weights: constraint
+    # weights replacing the ones of the instance
+    instance = problem if isinstance(
+        problem, ProblemInstance) else loadProblem(problem)
+    return SolverContext(instance, config, weights, seed)
+
+
+def solve(problem='./data', config=None, seed=None, weights=None, report=False):
+    # Returns the best Schedule, see createContext for the parameters
+    return runSolve(createContext(problem, config, weights, seed), report)
+
+
+def solveMany(jobs, workers=None, processes=False):
+    # jobs: (problem, config, seed) or (problem, config, seed, weights)
+    # tuples, solved side by side by up to workers threads, or worker
+    # processes with processes=True. Threads share the interpreter lock, so
+    # processes are faster for jobs that take longer than starting a process.
+    # Returns the best schedules in the order of jobs.
+    contexts = []
+    for index, (problem, config, seed, *weights) in enumerate(jobs):
+        config = dict(config or {})
+        # Jobs in the same directory must not overwrite each other's checkpoint
+        config.setdefault('CHECKPOINT_NAME', f'best, job {index}')
+        contexts.append(createContext(
+            problem, config, weights[0] if weights else None, seed))
+
+    workers = workers or multiprocessing.cpu_count()
+    if processes:
+        executor = concurrent.futures.ProcessPoolExecutor(
+            workers, mp_context=multiprocessing.get_context('spawn'))
+    else:
+        executor = concurrent.futures.ThreadPoolExecutor(workers)
+    with executor:
+        futures = [executor.submit(runSolve, context, False)
+                   for context in contexts]
+        return [future.result() for future in futures]
+
+
+def runSolve(context, report):
+    if context.WARM_START_SCHEDULE:
+        return warmStart(context, report=report)
+    if context.ENGINE in ['annealing', 'tabu']:
+        return trajectorySearch(context, report=report)
+    if context.ISLANDS:
+        return islandEvolution(context, report=report)
+    return evolution(context, report=report)
@@ -0,0 +1,445 @@
+from classes import Individual, createIndividual
+from array import array
+from context import SolverContext
+from evolve import *
+from problem import loadProblem
+from trajectory import trajectorySearch
+from warmstart import warmStart, countMovedSessions
+import copy
+import occupancy
+import sys
+import time
+import tracemalloc
+
+
+def measureMemory(create):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = create()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return objects, after - before
+
+
+def copyIndividual(individual):
+    return Individual(array('b', individual.genome), individual.fitness, individual.isFeasible)
+
+
+def benchmarkMemory(context, individualCount=100000, scheduleCount=200):
+    population = generatePopulation(context, scheduleCount)
+    states = [schedule.state for schedule in population]
+
+    schedules, scheduleMemory = measureMemory(
+        lambda: [Schedule(context, state) for state in states])
+    compact = [createIndividual(schedule) for schedule in population]
+    individuals, individualMemory = measureMemory(
+        lambda: [copyIndividual(compact[index % scheduleCount]) for index in range(individualCount)])
+
+    perSchedule = scheduleMemory / len(schedules)
+    perIndividual = individualMemory / len(individuals)
+
+    print(f'Schedule:\t\t{round(perSchedule)} bytes')
+    print(f'Individual:\t\t{round(perIndividual)} bytes')
+    print(
+        f'{individualCount} individuals:\t{round(individualMemory / 2 ** 20, 1)} MiB ({round(perSchedule * individualCount / 2 ** 30, 1)} GiB as Schedules)')
+
+
+def forceViolationLists(schedule):
+    for name in violationLists:
+        getattr(schedule, name)
+    return schedule
+
+
+def measureTime(create, repeat):
+    time0 = time.perf_counter()
+    for _ in range(repeat):
+        create()
+    return (time.perf_counter() - time0) / repeat
+
+
+def benchmarkConstruction(context, repeat=5):
+    population = generatePopulation(context, context.SIZE)
+    states = [schedule.state for schedule in population]
+
+    lazy = measureTime(
+        lambda: [Schedule(context, state) for state in states], repeat)
+    eager = measureTime(
+        lambda: [forceViolationLists(Schedule(context, state)) for state in states], repeat)
+
+    print(f'Population size:\t{context.SIZE}')
+    print(f'Counts only:\t\t{round(lazy * 1000, 1)} ms per generation')
+    print(f'With all lists:\t\t{round(eager * 1000, 1)} ms per generation')
+    print(f'Saved:\t\t\t{round((eager - lazy) * 1000, 1)} ms per generation ({round(100 * (1 - lazy / eager))}%)')
+
+
+def createCrossoverStates(context, population):
+    states = []
+    for index in range(0, len(population) - 1, 2):
+        semesters1 = list(population[index].semesters)
+        semesters2 = list(population[index + 1].semesters)
+        semesterIndex = context.random.choice(range(8))
+        semesters1[semesterIndex], semesters2[semesterIndex] = semesters2[semesterIndex], semesters1[semesterIndex]
+        states.append([session for semester in semesters1 for session in semester])
+        states.append([session for semester in semesters2 for session in semester])
+    return states
+
+
+def benchmarkCrossover(context, repeat=5):
+    context.fitnessCache.reset(0)
+    population = generatePopulation(context, context.SIZE)
+    states = createCrossoverStates(context, population)
+
+    context.semesterCache.reset(0)
+    uncached = measureTime(
+        lambda: [Schedule(context, state) for state in states], repeat)
+
+    def evaluateWithCache():
+        # The parents are in the cache, like after the previous generation
+        context.semesterCache.reset(context.SEMESTER_CACHE_SIZE)
+        for schedule in population:
+            Schedule(context, schedule.state)
+        time0 = time.perf_counter()
+        for state in states:
+            Schedule(context, state)
+        return time.perf_counter() - time0
+
+    cached = sum(evaluateWithCache() for _ in range(repeat)) / repeat
+    context.semesterCache.reset(0)
+
+    print(f'Crossover children:\t{len(states)}')
+    print(f'Without semester cache:\t{round(uncached * 1000, 1)} ms per generation')
+    print(f'With semester cache:\t{round(cached * 1000, 1)} ms per generation ({round(100 * (1 - cached / uncached))}% less)')
+
+
+def benchmarkInitialisation(context, sizes=(100, 1000, 10000), workers=None):
+    workers = workers or max(context.WORKERS, multiprocessing.cpu_count())
+    pool = createWorkerPool(context, workers)
+
+    print(f'Workers:\t{workers}\n')
+    print('Size\tSerial\t\tParallel')
+    for size in sizes:
+        time0 = time.perf_counter()
+        generatePopulation(context, size)
+        time1 = time.perf_counter()
+        parallelPopulation(context, pool, size)
+        time2 = time.perf_counter()
+        print(f'{size}\t{round(time1 - time0, 2)} s\t\t{round(time2 - time1, 2)} s')
+
+    pool.close()
+    pool.join()
+
+
+def getFitnessAtTime(history, elapsed):
+    reached = [fitness for time, _, fitness in history if time <= elapsed]
+    return reached[-1] if reached else None
+
+
+def getGenerationOfFitness(history, fitness):
+    return next((generation + 1 for _, generation, bestFitness in history if bestFitness >= fitness), None)
+
+
+def benchmarkLocalSearch(context, budgets=(0, 60, 120, 240), size=40, generations=60, seed=3):
+    histories = {}
+    for budget in budgets:
+        histories[budget] = []
+        evolution(context.withConstants({'SIZE': size, 'GENERATION_LIMIT': generations,
+                                         'LOCAL_SEARCH_BUDGET': budget}, seed),
+                  report=False, history=histories[budget])
+
+    # Fitness vs wall clock
+    duration = max(history[-1][0] for history in histories.values())
+    print('Seconds\t' + '\t'.join(f'budget {budget}' for budget in budgets))
+    for step in range(1, 11):
+        elapsed = duration * step / 10
+        fitnesses = [getFitnessAtTime(histories[budget], elapsed)
+                     for budget in budgets]
+        print(f'{round(elapsed, 1)}\t' + '\t\t'.join(
+            str(round(fitness, 2)) if fitness is not None else '-' for fitness in fitnesses))
+
+    target = histories[budgets[0]][-1][2]
+    print(f'\nGenerations to reach {round(target, 2)}:')
+    for budget in budgets:
+        generation = getGenerationOfFitness(histories[budget], target)
+        print(f'budget {budget}:\t{generation if generation else "not reached"}')
+
+
+def getTimeOfFitness(history, fitness):
+    return next((time for time, _, bestFitness in history if bestFitness >= fitness), None)
+
+
+def benchmarkTrajectory(context, size=100, generations=60, steps={'annealing': 30000, 'tabu': 3000}, seed=3):
+    # Time to quality of the single trajectory engines against the GA as
+    # configured in the data directory, with its hill climbing budget
+    histories = {'genetic': []}
+    evolution(context.withConstants({'SIZE': size, 'GENERATION_LIMIT': generations}, seed),
+              report=False, history=histories['genetic'])
+    for method, stepsOfMethod in steps.items():
+        histories[method] = []
+        trajectorySearch(context.withConstants({'TRAJECTORY_STEPS': stepsOfMethod}, seed),
+                         method, report=False, history=histories[method])
+
+    methods = list(histories)
+    duration = max(history[-1][0] for history in histories.values())
+    print('Seconds\t' + '\t'.join(methods))
+    for step in range(1, 11):
+        elapsed = duration * step / 10
+        fitnesses = [getFitnessAtTime(histories[method], elapsed)
+                     for method in methods]
+        print(f'{round(elapsed, 1)}\t' + '\t\t'.join(
+            str(round(fitness, 2)) if fitness is not None else '-' for fitness in fitnesses))
+
+    target = histories['genetic'][-1][2]
+    print(f'\nSeconds to reach {round(target, 2)}:')
+    for method in methods:
+        elapsed = getTimeOfFitness(histories[method], target)
+        print(f'{method}:\t{round(elapsed, 1) if elapsed is not None else "not reached"}')
+
+
+def sortPopulation(population):
+    return sorted(population, key=lambda schedule: schedule.fitness, reverse=True)
+
+
+def extractSorted(context, population):
+    # What evolution() did before: three full sorts per generation
+    sorted(population, key=lambda schedule: schedule.fitness)
+    sortPopulation(population)[0]
+    return sortPopulation(population)[:context.ELITE_SIZE]
+
+
+def extractPartial(context, population):
+    min(schedule.fitness for schedule in population)
+    max(population, key=lambda schedule: schedule.fitness)
+    return getElites(context, population, context.ELITE_SIZE)
+
+
+def benchmarkSelection(context, sizes=(1000, 10000, 50000), repeat=5):
+    individual = createIndividual(generatePopulation(context, 1)[0])
+
+    print('Size\tSorted\t\tHeap\t\tPartition\tRoulette\tTournament')
+    for size in sizes:
+        population = [Individual(individual.genome, context.random.uniform(-50, 60), False)
+                      for _ in range(size)]
+        times = [measureTime(lambda: extractSorted(context, population), repeat)]
+        for method in ['heap', 'partition']:
+            contextOfMethod = context.withConstants({'ELITE_EXTRACTION': method})
+            times.append(measureTime(
+                lambda: extractPartial(contextOfMethod, population), repeat))
+        for method in ['roulette', 'tournament']:
+            contextOfMethod = context.withConstants({'SELECTION_METHOD': method})
+            times.append(measureTime(
+                lambda: selection(contextOfMethod, population, size - context.ELITE_SIZE, []), repeat))
+        print(f'{size}\t' + '\t\t'.join(f'{round(elapsed * 1000, 1)} ms' for elapsed in times))
+
+
+violationLists = ['semesterCollisions', 'teacherCollisions', 'multiTeacherCollisions', 'teacherAvailabilityViolations',
+                  'breakHourViolations', 'departmentMeetingViolations', 'fridayBreakViolations', 'languageSessionViolations',
+                  'freeDays', 'singleSessionDays', 'multipleCourseSessions', 'slotSpan', 'availableSlots',
+                  'availableSlotMasks', 'emptySlots', 'allSlotsUsedDays', 'cannotCollideViolations']
+
+
+def rebuildWithoutCaches(context, state):
+    # Disabling the caches by their size keeps their entries
+    sizes = context.fitnessCache.size, context.semesterCache.size
+    context.fitnessCache.size = context.semesterCache.size = 0
+    try:
+        return Schedule(context, state)
+    finally:
+        context.fitnessCache.size, context.semesterCache.size = sizes
+
+
+def describeEvaluation(schedule):
+    # The compared schedules have their own session copies, so sessions are compared by id
+    def describe(value):
+        if isinstance(value, Session):
+            return value.id
+        if isinstance(value, (list, tuple, set)):
+            return [describe(item) for item in value]
+        return value
+
+    return {name: describe(getattr(schedule, name))
+            for name in ['fitness', 'isFeasible', 'violationCounts'] + violationLists}
+
+
+def checkEvaluation(schedule, expected, path):
+    actual = describeEvaluation(schedule)
+    differences = [name for name in expected if actual[name] != expected[name]]
+    assert not differences, f'{path} evaluation differs from a rebuild in {", ".join(differences)}'
+
+
+def benchmarkDeltaEvaluation(context, size=20, rounds=10, moves=5):
+    # Regression check: the delta, cached and lazy evaluation paths have to
+    # give the same fitness and violation lists as a Schedule built from scratch
+    checks = {'delta': 0, 'local move': 0, 'cached': 0,
+              'cached and moved': 0, 'delta from cached': 0}
+    population = generatePopulation(context, size)
+    # The caches are only enabled by evolution, the cached paths need them
+    context.fitnessCache.reset(10000)
+    context.semesterCache.reset(10000)
+    try:
+        for schedule in population:
+            for index in range(rounds):
+                mutated = performMutation(schedule, index % 4)
+                expected = describeEvaluation(
+                    rebuildWithoutCaches(context, mutated.state))
+                checkEvaluation(mutated, expected, 'Delta')
+                checks['delta'] += 1
+
+                for changes in list(generateLocalMoves(mutated))[:moves]:
+                    candidate = tryLocalMove(mutated, changes)
+                    checkEvaluation(candidate, describeEvaluation(
+                        rebuildWithoutCaches(context, candidate.state)), 'Local move')
+                    checks['local move'] += 1
+
+                # The fitness comes from the cache and the cells are restored on
+                # first access, also when the sessions were moved before that
+                cached = Schedule(context, mutated.state)
+                checkEvaluation(cached, expected, 'Cached')
+                checks['cached'] += 1
+                cached = Schedule(context, mutated.state)
+                for session in context.random.sample(cached.state, moves):
+                    session.day = (session.day + 1) % 5
+                checkEvaluation(cached, expected, 'Cached and moved')
+                checks['cached and moved'] += 1
+
+                schedule = performMutation(
+                    Schedule(context, mutated.state), index % 4)
+                checkEvaluation(schedule, describeEvaluation(
+                    rebuildWithoutCaches(context, schedule.state)), 'Delta from cached')
+                checks['delta from cached'] += 1
+    finally:
+        context.fitnessCache.reset(0)
+        context.semesterCache.reset(0)
+
+    for path, count in checks.items():
+        print(f'{path.capitalize() + ":":<20}{count} schedules equal to a rebuild')
+
+
+def makeTeacherUnavailable(context, schedule):
+    # The one line change: the teacher with the most sessions on one day of
+    # the schedule becomes unavailable on that day. Returns the context of the
+    # changed instance, the teacher and the sessions of the day.
+    days = [(session.teacher.id, session.day) for session in schedule.state]
+    teacherId, day = max(set(days), key=days.count)
+    problem = copy.deepcopy(context.problem)
+    teacherIndex = context.teacherIndices[teacherId]
+    problem.teacherData[teacherIndex]['unavailable'][day] = list(
+        range(FIRST_HOUR, FIRST_HOUR + SLOT_COUNT))
+    changed = SolverContext(problem, context.constants, context.weights)
+    return changed, changed.teachers[teacherIndex], days.count((teacherId, day))
+
+
+def benchmarkWarmStart(context, size=100, generations=1000, seed=5):
+    # Re-planning after a teacher lost a day: the GA from random schedules
+    # against the warm start from the schedule planned before the change
+    constants = {'SIZE': size, 'GENERATION_LIMIT': generations}
+    histories = {'cold': [], 'warm': []}
+    results = {}
+
+    published = evolution(context.withConstants(
+        constants, seed), report=False)
+    positions = dict(enumerate(published.positions))
+    changed, teacher, sessionCount = makeTeacherUnavailable(
+        context, published)
+    print(f'{teacher.firstName} {teacher.lastName} unavailable on a day with {sessionCount} sessions, '
+          f'fitness {round(published.fitness, 2)} before the change\n')
+
+    results['cold'] = evolution(changed.withConstants(constants, seed),
+                                report=False, history=histories['cold'])
+    results['warm'] = warmStart(changed.withConstants(constants, seed), published,
+                                report=False, history=histories['warm'])
+
+    target = results['cold'].fitness
+    print('Start\tFitness\tFeasible\tSeconds\tSeconds to reach cold\tSessions moved')
+    for name, best in results.items():
+        elapsed = getTimeOfFitness(histories[name], target)
+        print(f'{name}\t{round(best.fitness, 2)}\t{best.isFeasible}\t\t{round(histories[name][-1][0], 1)}\t'
+              f'{round(elapsed, 1) if elapsed is not None else "not reached"}\t\t\t'
+              f'{countMovedSessions(best, positions)}')
+
+
+def getFirstFeasible(context):
+    # Generations and seconds until the best schedule has no hard constraint
+    # violations, 0 generations if the initial population has one
+    time0 = time.time()
+    steps = evolutionSteps(context)
+    try:
+        for snapshot in steps:
+            if snapshot.isFeasible:
+                return snapshot.generation + 1, time.time() - time0
+    finally:
+        steps.close()
+    return None, time.time() - time0
+
+
+def benchmarkRepair(context, size=100, generations=300, seeds=(1, 2, 3, 4, 5)):
+    # Generations to the first feasible schedule with the smart mutation and
+    # no hill climbing, without and with the repair after every crossover
+    constants = {'SIZE': size, 'GENERATION_LIMIT': generations, 'STAGNATION_LIMIT': generations,
+                 'MUTATION_TYPE': 3, 'LOCAL_SEARCH_BUDGET': 0}
+
+    results = {False: [], True: []}
+    print('Seed\tSmart mutation\t\tWith repair')
+    for seed in seeds:
+        for isRepaired in results:
+            results[isRepaired].append(getFirstFeasible(context.withConstants(
+                dict(constants, CROSSOVER_REPAIR=isRepaired), seed)))
+        print(f'{seed}\t' + '\t\t'.join(
+            f'{generation if generation is not None else "-"} ({round(elapsed, 1)} s)'
+            for generation, elapsed in (results[False][-1], results[True][-1])))
+
+    for isRepaired, name in [(False, 'Smart mutation'), (True, 'With repair')]:
+        reached = [result for result in results[isRepaired] if result[0] is not None]
+        if reached:
+            print(f'{name}: {len(reached)}/{len(seeds)} feasible, mean {round(sum(generation for generation, _ in reached) / len(reached), 1)} '
+                  f'generations, {round(sum(elapsed for _, elapsed in reached) / len(reached), 1)} s')
+        else:
+            print(f'{name}: 0/{len(seeds)} feasible')
+
+
+def benchmarkBatchEvaluation(context, sizes=(100, 1000), repeat=3):
+    # The batched evaluation has to give the fitness of Schedule for every individual
+    tables = occupancy.OccupancyTables(context)
+    print('Size\tSchedule\tBatched')
+    for size in sizes:
+        population = generatePopulation(context, size)
+        states = [schedule.state for schedule in population]
+        days, hours = occupancy.encodePopulation(context, population)
+
+        context.fitnessCache.reset(0)
+        context.semesterCache.reset(0)
+        perSchedule = measureTime(
+            lambda: [Schedule(context, state) for state in states], repeat)
+        batched = measureTime(
+            lambda: occupancy.evaluatePopulation(tables, days, hours), repeat)
+        context.resetCaches()
+
+        fitness, isFeasible, counts = occupancy.evaluatePopulation(
+            tables, days, hours)
+        for index, schedule in enumerate(population):
+            expected = schedule.countViolations()
+            assert {key: int(count[index]) for key, count in counts.items()} == expected, \
+                f'Counts of individual {index} differ'
+            assert abs(fitness[index] - schedule.fitness) < 1e-9, \
+                f'Fitness of individual {index} differs: {fitness[index]} != {schedule.fitness}'
+            assert bool(isFeasible[index]) == schedule.isFeasible
+        print(f'{size}\t{round(perSchedule * 1000, 1)} ms\t{round(batched * 1000, 1)} ms')
+
+
+if __name__ == '__main__':
+    benchmarks = {
+        'memory': benchmarkMemory,
+        'construction': benchmarkConstruction,
+        'crossover': benchmarkCrossover,
+        'batch': benchmarkBatchEvaluation,
+        'delta': benchmarkDeltaEvaluation,
+        'initialisation': benchmarkInitialisation,
+        'localsearch': benchmarkLocalSearch,
+        'trajectory': benchmarkTrajectory,
+        'selection': benchmarkSelection,
+        'warmstart': benchmarkWarmStart,
+        'repair': benchmarkRepair,
+    }
+    context = SolverContext(loadProblem())
+    for name in sys.argv[1:] or benchmarks:
+        print(f'\n----- {name} -----\n')
+        benchmarks[name](context)
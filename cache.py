@@ -0,0 +1,52 @@
+from collections import OrderedDict
+
+
+class FitnessCache:
+    # Least recently used results of evaluated genomes, a size of 0 disables the cache
+    def __init__(self, name, size=0):
+        self.name = name
+        self.reset(size)
+
+    def reset(self, size):
+        self.size = size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        if not self.size:
+            return None
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key, entry):
+        if not self.size:
+            return
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def getCounters(self):
+        return self.hits, self.misses, self.evictions
+
+    def addCounters(self, counters):
+        hits, misses, evictions = counters
+        self.hits += hits
+        self.misses += misses
+        self.evictions += evictions
+
+    def calculateHitRate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0
+
+    def printStats(self):
+        print(
+            f'{self.name}:\t\t\t{self.hits} hits, {self.misses} misses, {self.evictions} evictions ({round(100 * self.calculateHitRate(), 1)}% hit rate)')
@@ -1,10 +1,15 @@
 from utils import *
+from slots import *
 from collections import Counter
+from functools import cached_property
+from array import array
 import copy
-import random
 
 
 class Course:
+    __slots__ = ('id', 'name', 'code', 'department',
+                 'year', 'cannotCollideWith')
+
     def __init__(self, id, name, code, department, year, cannotCollideWith):
         self.id = id
         self.name = name
@@ -13,22 +18,35 @@ class Course:
         self.year = year
         self.cannotCollideWith = cannotCollideWith
 
+    def __setstate__(self, state):
+        setSlotState(self, state)
+
     def print(self):
         print(f"{self.id}: {self.name} ({self.code}), {self.department}/{self.year}")
 
 
 class Teacher:
+    __slots__ = ('id', 'firstName', 'lastName', 'unavailable')
+
     def __init__(self, id, firstName, lastName, unavailable):
         self.id = id
         self.firstName = firstName
         self.lastName = lastName
         self.unavailable = unavailable
 
+    def __setstate__(self, state):
+        setSlotState(self, state)
+
     def print(self):
         print(f"{self.id}: {self.firstName} {self.lastName}")
 
 
 class Session:
+    # Only day and hour differ between the copies of a session, everything
+    # else refers to the objects created once by generateObjects()
+    __slots__ = ('id', 'course', 'teacher', 'length',
+                 'isFixed', 'isLab', 'suffix', 'day', 'hour')
+
     def __init__(self, id, course, teacher, length, isLab=False, suffix=None, isFixed=False, day=None, hour=None):
         self.id = id
         self.course = course
@@ -38,11 +56,17 @@ class Session:
         self.isFixed = isFixed
         self.isLab = isLab
         self.suffix = suffix
-        self.name = self.course.name if not self.isLab else self.course.name + ' - ' + self.suffix
 
         self.day = day
         self.hour = hour
 
+    def __setstate__(self, state):
+        setSlotState(self, state)
+
+    @property
+    def name(self):
+        return self.course.name if not self.isLab else self.course.name + ' - ' + self.suffix
+
     def print(self):
         print(
             f"{self.id}: {self.name} ({self.length}), {self.teacher.firstName} {self.teacher.lastName}")
@@ -52,61 +76,323 @@ class Session:
 
 
 class Schedule:
-    def __init__(self, state):
+    def __init__(self, context, state):
+        self.context = context
         self.state = createState(state)
+        self.positions = getPositions(context, self.state)
+        self.sessionsById = indexSessions(context, self.state)
 
         self.semesters = self.filterSemesters()
         self.teacherSessions = self.filterByTeachers()
+        self.multiTeacherSessions = self.filterByMultiTeachers()
+
+        if not self.evaluateFromCache():
+            self.calculateViolationCells()
+            self.evaluate()
 
-        self.semesterCollisions = self.calculateSemesterCollisions()
-        self.teacherCollisions = self.calculateTeacherCollisions()
-        self.multiTeacherCollisions = self.calculateMultiTeacherSessionCollisions()
-        self.teacherAvailabilityViolations = self.calculateTeacherAvailabilityViolations()
-        self.cannotCollideViolations = self.calculateCannotCollideViolations()
+        self.hasAllSessions = self.calculateHasAllSessions()
+
+    def withMovedSessions(self, movedSessions):
+        # Same result as Schedule(self.context, self.state), but only the
+        # semester/day and teacher/day cells touched by the moved sessions are
+        # recalculated.
+        context = self.context
+        schedule = Schedule.__new__(Schedule)
+        schedule.context = context
+        schedule.state = createState(self.state)
+        schedule.positions = getPositions(context, schedule.state)
+        schedule.sessionsById = indexSessions(context, schedule.state)
+
+        schedule.semesters = schedule.filterSemesters()
+        schedule.teacherSessions = schedule.filterByTeachers()
+        schedule.multiTeacherSessions = schedule.filterByMultiTeachers()
+
+        # Sessions of self.state may also have been moved through another
+        # reference, so compare against the positions at construction time.
+        movedIds = {session.id for session in movedSessions}
+        changedSessions = []
+        affectedSemesterDays = set()
+        affectedTeacherDays = set()
+        affectedMultiTeacherDays = set()
+
+        if schedule.evaluateFromCache():
+            schedule.hasAllSessions = schedule.calculateHasAllSessions()
+            return schedule
+
+        for session in schedule.state:
+            oldPosition = self.positions[session.id]
+            if session.id not in movedIds and oldPosition == schedule.positions[session.id]:
+                continue
+
+            changedSessions.append(session)
+            semesterIndex = getSemesterIndex(
+                session.course.department, session.course.year)
+            teacherIndex = context.teacherIndices[session.teacher.id]
+            for day in {oldPosition[0], session.day}:
+                affectedSemesterDays.add((semesterIndex, day))
+                affectedTeacherDays.add((teacherIndex, day))
+                for multiTeacherIndex, teacherId in enumerate(context.multiTeachers):
+                    if session.teacher.id == teacherId or session.course.id == context.multiTeacherCourseId:
+                        affectedMultiTeacherDays.add((multiTeacherIndex, day))
+
+        schedule.semesterCollisionCounts = schedule.updateCells(
+            self.semesterCollisionCounts, schedule.semesters, affectedSemesterDays, schedule.countCollisionsOfDay)
+        schedule.teacherCollisionCounts = schedule.updateCells(
+            self.teacherCollisionCounts, schedule.teacherSessions, affectedTeacherDays, schedule.countCollisionsOfDay)
+        schedule.multiTeacherCollisionCounts = schedule.updateCells(
+            self.multiTeacherCollisionCounts, schedule.multiTeacherSessions, affectedMultiTeacherDays, schedule.countCollisionsOfDay)
+        schedule.teacherAvailabilityCounts = schedule.updateCells(
+            self.teacherAvailabilityCounts, schedule.teacherSessions, affectedTeacherDays, schedule.countTeacherAvailabilityViolationsOfDay)
+        schedule.constraintCells = schedule.updateCells(
+            self.constraintCells, schedule.semesters, affectedSemesterDays, schedule.calculateConstraintsOfDay)
+
+        affectedPairs = {pairIndex for session in changedSessions
+                         for pairIndex in context.cannotCollidePairsOfSession[session.id]}
+        schedule.cannotCollideOverlaps = {pairIndex for pairIndex in self.cannotCollideOverlaps
+                                          if pairIndex not in affectedPairs}
+        schedule.cannotCollideOverlaps.update(
+            pairIndex for pairIndex in affectedPairs if schedule.isCannotCollidePairOverlapping(pairIndex))
+
+        if any(session.isFixed for session in changedSessions):
+            schedule.fixedSessionViolations = schedule.calculateFixedSlotViolations()
+        else:
+            schedule.fixedSessionViolations = [
+                list(violation) for violation in self.fixedSessionViolations]
+
+        schedule.evaluate()
+        schedule.hasAllSessions = schedule.calculateHasAllSessions()
+
+        return schedule
+
+    def calculateViolationCells(self):
+        # Only the counts needed by calculateFitness are calculated here, the
+        # violation lists are built from them on first access
+        self.calculateSemesterCells()
+        self.teacherCollisionCounts = self.calculateCells(
+            self.teacherSessions, self.countCollisionsOfDay)
+        self.multiTeacherCollisionCounts = self.calculateCells(
+            self.multiTeacherSessions, self.countCollisionsOfDay)
+        self.teacherAvailabilityCounts = self.calculateCells(
+            self.teacherSessions, self.countTeacherAvailabilityViolationsOfDay)
+
+        self.cannotCollideOverlaps = self.calculateCannotCollideOverlaps()
         self.fixedSessionViolations = self.calculateFixedSlotViolations()
 
-        results = self.calculateConstraints()
-
-        self.breakHourViolations = results[0]
-        self.departmentMeetingViolations = results[1]
-        self.fridayBreakViolations = results[2]
-        self.languageSessionViolations = results[3]
-        self.freeDays = results[4]
-        self.singleSessionDays = results[5]
-        self.multipleCourseSessions = results[6]
-        self.slotSpan = results[7]
-        self.availableSlots = results[8]
-        self.emptySlots = results[9]
-        self.allSlotsUsedDays = self.calculateAllSlotsUsedDays()
-
-        isFeasible, fitness = self.calculateFitness()
+    def calculateSemesterCells(self):
+        # The semester-local results only depend on the positions of the
+        # sessions of the semester, so a crossover child takes the semesters
+        # it shares with its parents from the cache
+        semesterCache = self.context.semesterCache
+        self.semesterCollisionCounts = []
+        self.constraintCells = []
+        for index, semester in enumerate(self.semesters):
+            key = encodeSemesterGenome(self.context, index, semester)
+            cells = semesterCache.get(key)
+            if cells is None:
+                sessionsOfDays = groupByDay(semester)
+                cells = ([countCollisions(sessionsOfDay) for sessionsOfDay in sessionsOfDays],
+                         [self.calculateConstraintsOfDay(index, day, sessionsOfDay)
+                          for day, sessionsOfDay in enumerate(sessionsOfDays)])
+                semesterCache.put(key, cells)
+            self.semesterCollisionCounts.append(cells[0])
+            self.constraintCells.append(cells[1])
+
+    def evaluate(self):
+        self.violationCounts = self.calculateViolationCounts()
+        isFeasible, fitness = calculateScore(self.context, self.violationCounts)
         self.fitness = fitness
         self.isFeasible = isFeasible
-        self.hasAllSessions = self.calculateHasAllSessions()
+        self.context.fitnessCache.put(encodeGenome(self.context, self.state).tobytes(),
+                                      (fitness, isFeasible, self.violationCounts))
+
+    def evaluateFromCache(self):
+        entry = self.context.fitnessCache.get(
+            encodeGenome(self.context, self.state).tobytes())
+        if entry is None:
+            return False
+        self.fitness, self.isFeasible, self.violationCounts = entry
+        return True
+
+    def restoreViolationCells(self):
+        # A schedule evaluated from the cache calculates its cells only when the
+        # violation lists or withMovedSessions need them. The sessions may have
+        # been moved since, so the cells are calculated on copies at the
+        # positions this schedule was created with.
+        schedule = Schedule.__new__(Schedule)
+        schedule.context = self.context
+        schedule.state = createState(self.state)
+        for session in schedule.state:
+            session.day, session.hour = self.positions[session.id]
+        schedule.sessionsById = indexSessions(self.context, schedule.state)
+        schedule.semesters = schedule.filterSemesters()
+        schedule.teacherSessions = schedule.filterByTeachers()
+        schedule.multiTeacherSessions = schedule.filterByMultiTeachers()
+        schedule.calculateViolationCells()
+
+        for name in violationCellNames:
+            self.__dict__.setdefault(name, getattr(schedule, name))
+        return self
+
+    @cached_property
+    def semesterCollisionCounts(self):
+        return self.restoreViolationCells().semesterCollisionCounts
+
+    @cached_property
+    def teacherCollisionCounts(self):
+        return self.restoreViolationCells().teacherCollisionCounts
+
+    @cached_property
+    def multiTeacherCollisionCounts(self):
+        return self.restoreViolationCells().multiTeacherCollisionCounts
+
+    @cached_property
+    def teacherAvailabilityCounts(self):
+        return self.restoreViolationCells().teacherAvailabilityCounts
+
+    @cached_property
+    def constraintCells(self):
+        return self.restoreViolationCells().constraintCells
+
+    @cached_property
+    def cannotCollideOverlaps(self):
+        return self.restoreViolationCells().cannotCollideOverlaps
+
+    @cached_property
+    def fixedSessionViolations(self):
+        return self.restoreViolationCells().fixedSessionViolations
+
+    def calculateCells(self, rows, calculateCell):
+        return [[calculateCell(index, day, sessionsOfDay) for day, sessionsOfDay in enumerate(groupByDay(sessionsOfRow))]
+                for index, sessionsOfRow in enumerate(rows)]
+
+    def updateCells(self, cells, rows, affected, calculateCell):
+        # Rows without an affected cell are shared with the parent schedule
+        cells = list(cells)
+        for row in {row for row, _ in affected}:
+            cells[row] = list(cells[row])
+        for row, day in affected:
+            sessionsOfDay = [
+                session for session in rows[row] if session.day == day]
+            cells[row][day] = calculateCell(row, day, sessionsOfDay)
+        return cells
+
+    def getSessionsOfDay(self, sessionsOfRow, day):
+        # The sessions may have been moved after this schedule was created,
+        # the violation lists are always built from the original positions
+        return [session for session in sessionsOfRow if self.positions[session.id][0] == day]
+
+    def listViolationsOfCells(self, rows, counts, findViolationsOfDay):
+        violations = []
+        for index, countsOfRow in enumerate(counts):
+            for day, count in enumerate(countsOfRow):
+                if count:
+                    violations.extend(findViolationsOfDay(
+                        index, day, self.getSessionsOfDay(rows[index], day)))
+        return violations
+
+    def listConstraintCells(self, field):
+        return [(index, day) for index, cellsOfSemester in enumerate(self.constraintCells)
+                for day, cell in enumerate(cellsOfSemester) if cell[field]]
+
+    @cached_property
+    def semesterCollisions(self):
+        return self.listViolationsOfCells(
+            self.semesters, self.semesterCollisionCounts, self.findCollisionsOfDay)
+
+    @cached_property
+    def teacherCollisions(self):
+        return self.listViolationsOfCells(
+            self.teacherSessions, self.teacherCollisionCounts, self.findCollisionsOfDay)
+
+    @cached_property
+    def multiTeacherCollisions(self):
+        return self.listViolationsOfCells(
+            self.multiTeacherSessions, self.multiTeacherCollisionCounts, self.findCollisionsOfDay)
+
+    @cached_property
+    def teacherAvailabilityViolations(self):
+        return self.listViolationsOfCells(
+            self.teacherSessions, self.teacherAvailabilityCounts, self.findTeacherAvailabilityViolationsOfDay)
+
+    @cached_property
+    def multipleCourseSessions(self):
+        counts = [[cell[6] for cell in cellsOfSemester]
+                  for cellsOfSemester in self.constraintCells]
+        return self.listViolationsOfCells(
+            self.semesters, counts, self.findMultipleCourseSessionsOfDay)
+
+    @cached_property
+    def breakHourViolations(self):
+        return self.listConstraintCells(0)
+
+    @cached_property
+    def departmentMeetingViolations(self):
+        return [index for index, _ in self.listConstraintCells(1)]
+
+    @cached_property
+    def fridayBreakViolations(self):
+        return [index for index, _ in self.listConstraintCells(2)]
+
+    @cached_property
+    def languageSessionViolations(self):
+        return self.listConstraintCells(3)
+
+    @cached_property
+    def freeDays(self):
+        return self.listConstraintCells(4)
+
+    @cached_property
+    def singleSessionDays(self):
+        return [[index, day] for index, day in self.listConstraintCells(5)]
+
+    @cached_property
+    def slotSpan(self):
+        return [[cell[7] for cell in cellsOfSemester] for cellsOfSemester in self.constraintCells]
+
+    @cached_property
+    def emptySlots(self):
+        return [[index, day, emptySlot] for index, cellsOfSemester in enumerate(self.constraintCells)
+                for day, cell in enumerate(cellsOfSemester) for emptySlot in emptySlotHours[cell[8]]]
+
+    @cached_property
+    def availableSlotMasks(self):
+        return [[cell[9] for cell in cellsOfSemester] for cellsOfSemester in self.constraintCells]
+
+    @cached_property
+    def availableSlots(self):
+        return [[list(slotHours[mask]) for mask in masksOfSemester] for masksOfSemester in self.availableSlotMasks]
+
+    @cached_property
+    def allSlotsUsedDays(self):
+        return self.calculateAllSlotsUsedDays()
+
+    @cached_property
+    def cannotCollideViolations(self):
+        return self.listCannotCollideViolations()
 
     def filterSemesters(self):
-        semesters = []
-        for department in range(2):
-            for year in range(1, 5):
-                # semester = list(filter(lambda session: session.course.department ==
-                #                        department and session.course.year == year, self.state))
-                semester = [session for session in self.state if session.course.department ==
-                            department and session.course.year == year]
-                semesters.append(semester)
+        semesters = [[] for _ in range(8)]
+        for session in self.state:
+            semesters[getSemesterIndex(
+                session.course.department, session.course.year)].append(session)
 
         return semesters
 
     def filterByTeachers(self):
-        filtered = []
-        for teacher in teachers:
-            # teacherSessions = list(
-            #     filter(lambda session: session.teacher.id == teacher.id, self.state))
-            teacherSessions = [
-                session for session in self.state if session.teacher.id == teacher.id]
-            filtered.append(teacherSessions)
+        teacherIndices = self.context.teacherIndices
+        filtered = [[] for _ in self.context.teachers]
+        for session in self.state:
+            filtered[teacherIndices[session.teacher.id]].append(session)
         return filtered
 
+    def filterByMultiTeachers(self):
+        multiTeacherSession = [
+            session for session in self.state if session.course.id == self.context.multiTeacherCourseId][0]
+        return [self.teacherSessions[self.context.teacherIndices[teacherId]] + [multiTeacherSession]
+                for teacherId in self.context.multiTeachers]
+
     def print(self):
+        languageSlots = self.context.languageSlots
         for index, semester in enumerate(self.semesters):
             print(
                 f"\n\n----- {getSemesterName(index // 4, index % 4 + 1)} -----\n\n")
@@ -129,10 +415,11 @@ class Schedule:
             if sessionsOfTeacher[0].teacher.firstName != "":
                 print(
                     f'\n\n----- {sessionsOfTeacher[0].teacher.firstName} {sessionsOfTeacher[0].teacher.lastName} -----\n')
-                if sessionsOfTeacher[0].teacher.id in multiTeachers:
+                if sessionsOfTeacher[0].teacher.id in self.context.multiTeachers:
                     multiTeacherSession = [
-                        session for session in self.state if session.course.id == multiTeacherCourseId][0]
-                    sessionsOfTeacher.append(multiTeacherSession)
+                        session for session in self.state if session.course.id == self.context.multiTeacherCourseId][0]
+                    sessionsOfTeacher = sessionsOfTeacher + \
+                        [multiTeacherSession]
                 for day in range(5):
                     sessionsOfDay = list(filter(
                         lambda session: session.day == day, sessionsOfTeacher))
@@ -153,6 +440,7 @@ class Schedule:
                     f'{session.hour}.00 - {session.hour + session.length}.00 - {session.name}')
             print()
 
+        languageSlots = self.context.languageSlots
         for index, day in self.languageSessionViolations:
             print(
                 f'{getDayName(day)}: {languageSlots[1][0]}.00 - {languageSlots[1][1] + 1}.00 - Yabancı Dil ({index})')
@@ -294,295 +582,146 @@ class Schedule:
         print(
             f'fitness: {round(self.fitness, 2)} (isFeasible: {self.isFeasible})')
 
-    def calculateSemesterCollisions(self):
-        collisions = []
-        for semester in self.semesters:
-            for day in range(5):
-                # sessionsOfDay = list(filter(
-                #     lambda session: session.day == day, semester))
-                sessionsOfDay = [
-                    session for session in semester if session.day == day]
-                usedSlots = []
-                sessionIds = []
-                for session in sessionsOfDay:
-                    usedSlots.extend(
-                        list(range(session.hour, session.hour + session.length)))
-                    sessionIds.extend([session.id] * session.length)
-                collisionSlots = [
-                    item for item, count in Counter(usedSlots).items() if count > 1]
-                for collisionSlot in collisionSlots:
-                    indices = [index for index, slot in enumerate(
-                        usedSlots) if slot == collisionSlot]
-                    collisionSessions = []
-                    for index in indices:
-                        # collisionSession = list(filter(
-                        #     lambda session: session.id == sessionIds[index], sessionsOfDay))[0]
-                        collisionSession = [
-                            session for session in sessionsOfDay if session.id == sessionIds[index]][0]
-                        collisionSessions.append(collisionSession)
-                    collisions.append(collisionSessions)
-        return collisions
+    def countCollisionsOfDay(self, index, day, sessionsOfDay):
+        return countCollisions(sessionsOfDay)
 
-    def calculateTeacherCollisions(self):
-        collisions = []
-        for sessionsOfTeacher in self.teacherSessions:
-            for day in range(5):
-                # sessionsOfDay = list(filter(
-                #     lambda session: session.day == day, sessionsOfTeacher))
-                sessionsOfDay = [
-                    session for session in sessionsOfTeacher if session.day == day]
-                usedSlots = []
-                sessionIds = []
-
-                for session in sessionsOfDay:
-                    usedSlots.extend(
-                        list(range(session.hour, session.hour + session.length)))
-                    sessionIds.extend([session.id] * session.length)
-                collisionSlots = [
-                    item for item, count in Counter(usedSlots).items() if count > 1]
-                for collisionSlot in collisionSlots:
-                    indices = [index for index, slot in enumerate(
-                        usedSlots) if slot == collisionSlot]
-                    collisionSessions = []
-                    for index in indices:
-                        # collisionSession = list(filter(
-                        #     lambda session: session.id == sessionIds[index], sessionsOfDay))[0]
-                        collisionSession = [
-                            session for session in sessionsOfDay if session.id == sessionIds[index]][0]
-                        collisionSessions.append(collisionSession)
-                    collisions.append(collisionSessions)
-        return collisions
+    def findCollisionsOfDay(self, index, day, sessionsOfDay):
+        return findCollisions(sessionsOfDay, self.positions)
 
-    def calculateMultiTeacherSessionCollisions(self):
-        collisions = []
+    def countTeacherAvailabilityViolationsOfDay(self, teacherIndex, day, sessionsOfDay):
+        unavailableMask = self.context.unavailableMasks[teacherIndex][day]
+        if not unavailableMask:
+            return 0
+        return sum(slotCounts[getSessionMask(session.hour, session.length) & unavailableMask]
+                   for session in sessionsOfDay)
 
-        for teacherId in multiTeachers:
-            # sessionsOfTeacher = list(
-            #     filter(lambda session: session.teacher.id == teacherId, self.state))
-            sessionsOfTeacher = [
-                session for session in self.state if session.teacher.id == teacherId]
-            multiTeacherSession = [
-                session for session in self.state if session.course.id == multiTeacherCourseId][0]
-            sessionsOfTeacher.append(multiTeacherSession)
+    def findTeacherAvailabilityViolationsOfDay(self, teacherIndex, day, sessionsOfDay):
+        usedSlots = []
+        sessionIds = []
+        unavailableSlotsOfDay = sessionsOfDay[0].teacher.unavailable[day]
 
-            for day in range(5):
-                # sessionsOfDay = list(filter(
-                #     lambda session: session.day == day, sessionsOfTeacher))
-                sessionsOfDay = [
-                    session for session in sessionsOfTeacher if session.day == day]
-                usedSlots = []
-                sessionIds = []
-
-                for session in sessionsOfDay:
-                    usedSlots.extend(
-                        list(range(session.hour, session.hour + session.length)))
-                    sessionIds.extend([session.id] * session.length)
-                collisionSlots = [
-                    item for item, count in Counter(usedSlots).items() if count > 1]
-                for collisionSlot in collisionSlots:
-                    indices = [index for index, slot in enumerate(
-                        usedSlots) if slot == collisionSlot]
-                    collisionSessions = []
-                    for index in indices:
-                        # collisionSession = list(filter(
-                        #     lambda session: session.id == sessionIds[index], sessionsOfDay))[0]
-                        collisionSession = [
-                            session for session in sessionsOfDay if session.id == sessionIds[index]][0]
-                        collisionSessions.append(collisionSession)
-                    collisions.append(collisionSessions)
+        for session in sessionsOfDay:
+            hour = self.positions[session.id][1]
+            usedSlots.extend(
+                list(range(hour, hour + session.length)))
+            sessionIds.extend([session.id] * session.length)
 
-        return collisions
+        collisionSlots = [
+            slot for slot in usedSlots if slot in unavailableSlotsOfDay]
 
-    def calculateTeacherAvailabilityViolations(self):
         collisions = []
-        for sessionsOfTeacher in self.teacherSessions:
-            teacher = sessionsOfTeacher[0].teacher
-            for day in range(5):
-                # sessionsOfDay = list(filter(
-                #     lambda session: session.day == day, sessionsOfTeacher))
-                sessionsOfDay = [
-                    session for session in sessionsOfTeacher if session.day == day]
-                usedSlots = []
-                sessionIds = []
-                unavailableSlotsOfDay = teacher.unavailable[day]
-
-                for session in sessionsOfDay:
-                    usedSlots.extend(
-                        list(range(session.hour, session.hour + session.length)))
-                    sessionIds.extend([session.id] * session.length)
-
-                collisionSlots = [
-                    slot for slot in usedSlots if slot in unavailableSlotsOfDay]
-
-                for collisionSlot in collisionSlots:
-                    indices = [index for index, slot in enumerate(
-                        usedSlots) if slot == collisionSlot]
-                    collisionSessions = []
-                    for index in indices:
-                        # collisionSession = list(filter(
-                        #     lambda session: session.id == sessionIds[index], sessionsOfDay))[0]
-                        collisionSession = [
-                            session for session in sessionsOfDay if session.id == sessionIds[index]][0]
-                        collisionSessions.append(collisionSession)
-                    collisions.append(collisionSessions)
+        for collisionSlot in collisionSlots:
+            indices = [index for index, slot in enumerate(
+                usedSlots) if slot == collisionSlot]
+            collisionSessions = []
+            for index in indices:
+                collisionSession = [
+                    session for session in sessionsOfDay if session.id == sessionIds[index]][0]
+                collisionSessions.append(collisionSession)
+            collisions.append(collisionSessions)
         return collisions
 
-    def calculateCannotCollideViolations(self):
+    def findMultipleCourseSessionsOfDay(self, index, day, sessionsOfDay):
+        multipleSessions = []
+        courseIds = [session.course.id for session in sessionsOfDay]
+        multipleSessionCourseIds = [
+            item for item, count in Counter(courseIds).items() if count > 1]
+        for multipleSessionCourseId in multipleSessionCourseIds:
+            sessionsOfCourse = [
+                session for session in sessionsOfDay if session.course.id == multipleSessionCourseId]
+            multipleSessions.append(sessionsOfCourse)
+        return multipleSessions
+
+    def isCannotCollidePairOverlapping(self, pairIndex):
+        firstId, secondId = self.context.cannotCollidePairs[pairIndex][:2]
+        first = self.sessionsById[firstId]
+        second = self.sessionsById[secondId]
+        return first.day == second.day and \
+            bool(getSessionMask(first.hour, first.length) &
+                 getSessionMask(second.hour, second.length))
+
+    def calculateCannotCollideOverlaps(self):
+        return {pairIndex for pairIndex in range(len(self.context.cannotCollidePairs))
+                if self.isCannotCollidePairOverlapping(pairIndex)}
+
+    def listCannotCollideViolations(self):
+        # Each overlapping pair once, ordered and oriented like a scan of the
+        # state: (session, sessionThatItCannotCollideWith)
+        if not self.cannotCollideOverlaps:
+            return []
+
+        stateIndices = {session.id: index for index,
+                        session in enumerate(self.state)}
         violations = []
-        for session in self.state:
-            sessionSlots = list(
-                range(session.hour, session.hour + session.length))
-            sessionsToNotCollide = [
-                s for s in self.state if s.course.id in session.course.cannotCollideWith]
-            for sessionToNotCollide in sessionsToNotCollide:
-                if session.day == sessionToNotCollide.day:
-                    sessionToNotCollideSlots = list(range(
-                        sessionToNotCollide.hour, sessionToNotCollide.hour + sessionToNotCollide.length))
-                    sessionToNotCollideSlots.extend(sessionSlots)
-                    collisionSlots = [
-                        item for item, count in Counter(sessionToNotCollideSlots).items() if count > 1]
-                    if collisionSlots and (sessionToNotCollide, session) not in violations:
-                        violations.append((session, sessionToNotCollide))
+        for pairIndex in self.cannotCollideOverlaps:
+            firstId, secondId, firstListsSecond, secondListsFirst = self.context.cannotCollidePairs[pairIndex]
+            if not firstListsSecond or (secondListsFirst and stateIndices[secondId] < stateIndices[firstId]):
+                firstId, secondId = secondId, firstId
+            violations.append((firstId, secondId))
 
-        return violations
+        violations.sort(key=lambda violation: (
+            stateIndices[violation[0]], stateIndices[violation[1]]))
+        return [(self.sessionsById[firstId], self.sessionsById[secondId]) for firstId, secondId in violations]
 
     def calculateHasAllSessions(self):
         return len(self.state) == 87
 
     def calculateAllSlotsUsedDays(self):
         allSlotsUsedDays = []
-        for semesterIndex, semester in enumerate(self.availableSlots):
+        for semesterIndex, semester in enumerate(self.availableSlotMasks):
             for index, day in enumerate(semester):
                 if not day and index in [0, 1, 3]:
                     allSlotsUsedDays.append((semesterIndex, index))
         return allSlotsUsedDays
 
-    def calculateConstraints(self):
-        breakViolations = []
-        meetingViolations = []
-        fridayViolations = []
-        freeDays = []
-        singleSessionDays = []
-        multipleSessions = []
-        totalSlotSpan = []
-        languageSessionViolations = []
-        allAvailableSlots = []
-        allEmptySlots = []
+    def calculateConstraintsOfDay(self, index, day, sessionsOfDay):
+        usedMask = 0
+        courseIds = set()
+        multipleSessionCourseIds = set()
+        for session in sessionsOfDay:
+            usedMask |= getSessionMask(session.hour, session.length)
+            if session.course.id in courseIds:
+                multipleSessionCourseIds.add(session.course.id)
+            courseIds.add(session.course.id)
 
-        for index, semester in enumerate(self.semesters):
-            semesterSlotSpan = []
-            semesterAvailableSlots = copy.deepcopy(initialAvailableSlots)
-            for day in range(5):
+        languageSlots = self.context.languageSlots
+        availableMask = self.context.initialAvailableMasks[day] & ~usedMask
 
-                sessionsOfDay = [
-                    session for session in semester if session.day == day]
-                usedSlots = []
-                for session in sessionsOfDay:
-                    usedSlots.extend(
-                        list(range(session.hour, session.hour + session.length)))
-
-                semesterAvailableSlots[day] = [
-                    slot for slot in semesterAvailableSlots[day] if slot not in usedSlots]
-
-                # Check for break violations:
-                if day in [0, 1, 3] and (12 in usedSlots and 13 in usedSlots):
-                    breakViolations.append((index, day))
-
-                # Check for free days
-                if len(usedSlots) == 0 and day not in languageSlots[0]:
-                    freeDays.append((index, day))
-
-                # Check for friday violations
-                if day == 4 and (12 in usedSlots or 13 in usedSlots):
-                    fridayViolations.append(index)
-
-                # Check for meeting violations
-                if day == 2 and 13 in usedSlots:
-                    meetingViolations.append(index)
-
-                # Check for language session violations
-                if day in languageSlots[0] and (languageSlots[1][0] in usedSlots or languageSlots[1][1] in usedSlots):
-                    languageSessionViolations.append((index, day))
-
-                # Check for single-session days
-                if len(sessionsOfDay) == 1 and day in [0, 3, 4]:
-                    singleSessionDays.append([index, day])
-                elif len(sessionsOfDay) == 0 and day in languageSlots[0]:
-                    singleSessionDays.append([index, day])
-
-                # Check for multiple sessions of same course in the same day
-                courseIds = [session.course.id for session in sessionsOfDay]
-                multipleSessionCourseIds = [
-                    item for item, count in Counter(courseIds).items() if count > 1]
-                for multipleSessionCourseId in multipleSessionCourseIds:
-                    # sessionsOfCourse = list(filter(
-                    #     lambda session: session.course.id == multipleSessionCourseId, sessionsOfDay))
-                    sessionsOfCourse = [
-                        session for session in sessionsOfDay if session.course.id == multipleSessionCourseId]
-                    multipleSessions.append(sessionsOfCourse)
-
-                # Calculate the slot span
-                if day in languageSlots[0]:
-                    usedSlots.extend(languageSlots[1])
-
-                if len(usedSlots) != 0:
-                    earliestSlot = min(usedSlots)
-                    latestSlot = max(usedSlots)
-                    slotSpan = latestSlot - earliestSlot + 1
-                    semesterSlotSpan.append(slotSpan)
-                else:
-                    semesterSlotSpan.append(0)
-
-                # Calculate empty slots
-                if not usedSlots:
-                    continue
-
-                usedSlots.sort()
-                dayRange = list(range(usedSlots[0], usedSlots[-1] + 1))
-                dayRange = [
-                    slot for slot in dayRange if slot in semesterAvailableSlots[day]]
-
-                emptySlots = len(dayRange)
-
-                if 12 in dayRange or 13 in dayRange:
-                    emptySlots -= 1
-
-                if emptySlots:
-                    if 12 in dayRange and 13 in dayRange:
-                        # n = random.choice([12, 13])
-                        dayRange = [slot for slot in dayRange if slot != 13]
-                        for emptySlot in dayRange:
-                            allEmptySlots.append([index, day, emptySlot])
-                    elif 12 in dayRange:
-                        for emptySlot in dayRange:
-                            if emptySlot == 12:
-                                continue
-                            allEmptySlots.append([index, day, emptySlot])
-                    elif 13 in dayRange:
-                        for emptySlot in dayRange:
-                            if emptySlot == 13:
-                                continue
-                            allEmptySlots.append([index, day, emptySlot])
-                    else:
-                        for emptySlot in dayRange:
-                            allEmptySlots.append([index, day, emptySlot])
-
-            totalSlotSpan.append(semesterSlotSpan)
-            allAvailableSlots.append(semesterAvailableSlots)
-
-        violations = [breakViolations, meetingViolations, fridayViolations, languageSessionViolations,
-                      freeDays, singleSessionDays, multipleSessions, totalSlotSpan, allAvailableSlots, allEmptySlots]
+        # Check for break violations:
+        isBreakViolation = day in [0, 1, 3] and usedMask & BREAK_MASK == BREAK_MASK
 
-        return violations
+        # Check for free days
+        isFreeDay = not usedMask and day not in languageSlots[0]
+
+        # Check for friday violations
+        isFridayViolation = day == 4 and bool(usedMask & BREAK_MASK)
+
+        # Check for meeting violations
+        isMeetingViolation = day == 2 and bool(usedMask & getSlotBit(13))
+
+        # Check for language session violations
+        isLanguageViolation = day in languageSlots[0] and bool(
+            usedMask & (getSlotBit(languageSlots[1][0]) | getSlotBit(languageSlots[1][1])))
+
+        # Check for single-session days
+        isSingleSessionDay = (len(sessionsOfDay) == 1 and day in [0, 3, 4]) or \
+            (len(sessionsOfDay) == 0 and day in languageSlots[0])
+
+        # Calculate the slot span, the language session counts as used
+        usedMask |= self.context.languageMasks[day]
+        slotSpan = slotSpans[usedMask]
+
+        # Empty slots between the first and the last used slot
+        emptyMask = spanMasks[usedMask] & availableMask
+
+        return (isBreakViolation, isMeetingViolation, isFridayViolation, isLanguageViolation, isFreeDay,
+                isSingleSessionDay, len(multipleSessionCourseIds), slotSpan, emptyMask, availableMask)
 
     def calculateFixedSlotViolations(self):
         violations = []
-        currentFixedSessions = [
-            session for session in self.state if session.isFixed]
 
-        for fixedSession in fixedSessions:
-            currentFixedSession = [
-                session for session in currentFixedSessions if session.id == fixedSession.id][0]
+        for fixedSession in self.context.fixedSessions:
+            currentFixedSession = self.sessionsById[fixedSession.id]
 
             if currentFixedSession.day != fixedSession.day:
                 semester = getSemesterIndex(
@@ -592,63 +731,206 @@ class Schedule:
 
         return violations
 
+    def countViolations(self):
+        return dict(self.violationCounts)
+
+    def countHardViolations(self):
+        return sum(self.violationCounts[name] for name in hardConstraintNames)
+
+    def calculateViolationCounts(self):
+        constraintCells = [
+            cell for cellsOfSemester in self.constraintCells for cell in cellsOfSemester]
+        return {
+            'semesterCollisions': sumCells(self.semesterCollisionCounts),
+            'languageSessionViolations': sum(cell[3] for cell in constraintCells),
+            'teacherCollisions': sumCells(self.teacherCollisionCounts),
+            'multiTeacherCollisions': sumCells(self.multiTeacherCollisionCounts),
+            'breakHourViolations': sum(cell[0] for cell in constraintCells),
+            'fridayBreakViolations': sum(cell[2] for cell in constraintCells),
+            'departmentMeetingViolations': sum(cell[1] for cell in constraintCells),
+            'allSlotsUsedDays': sum(not cellsOfSemester[day][9] for cellsOfSemester in self.constraintCells for day in [0, 1, 3]),
+            'fixedSessionViolations': len(self.fixedSessionViolations),
+            'teacherAvailabilityViolations': sumCells(self.teacherAvailabilityCounts),
+            'freeDays': sum(cell[4] for cell in constraintCells),
+            'singleSessionDays': sum(cell[5] for cell in constraintCells),
+            'multipleCourseSessions': sum(cell[6] for cell in constraintCells),
+            'cannotCollideViolations': len(self.cannotCollideOverlaps),
+            'slotSpan': sum(cell[7] for cell in constraintCells),
+            'emptySlots': sum(emptySlotCounts[cell[8]] for cell in constraintCells),
+        }
+
     def calculateFitness(self):
-        # ! Hard Constraints
-        semesterCollisionCount = len(self.semesterCollisions)
-        languageSessionViolationCount = len(self.languageSessionViolations)
-        teacherCollisionCount = len(self.teacherCollisions)
-        multiTeacherCollisionCount = len(self.multiTeacherCollisions)
-        breakHourViolationCount = len(self.breakHourViolations)
-        fridayBreakViolationCount = len(self.fridayBreakViolations)
-        departmentMeetingViolationCount = len(self.departmentMeetingViolations)
-        allSlotsUsedDaysCount = len(self.allSlotsUsedDays)
-        fixedSessionViolationCount = len(self.fixedSessionViolations)
-
-        # ? Soft Constraints
-        teacherAvailabilityViolationCount = len(
-            self.teacherAvailabilityViolations)
-        freeDayCount = len(self.freeDays)
-        singleSessionDayCount = len(self.singleSessionDays)
-        multipleCourseSessionCount = len(self.multipleCourseSessions)
-        cannotCollideViolationCount = len(self.cannotCollideViolations)
-        slotSpan = sum([sum(semesterSlotSpan)
-                       for semesterSlotSpan in self.slotSpan])
-        emptySlotCount = len(self.emptySlots)
-
-        score = 50.0
+        return calculateScore(self.context, self.calculateViolationCounts())
+
+
+def calculateScore(context, counts):
+    # ! Hard Constraints
+    semesterCollisionCount = counts['semesterCollisions']
+    languageSessionViolationCount = counts['languageSessionViolations']
+    teacherCollisionCount = counts['teacherCollisions']
+    multiTeacherCollisionCount = counts['multiTeacherCollisions']
+    breakHourViolationCount = counts['breakHourViolations']
+    fridayBreakViolationCount = counts['fridayBreakViolations']
+    departmentMeetingViolationCount = counts['departmentMeetingViolations']
+    allSlotsUsedDaysCount = counts['allSlotsUsedDays']
+    fixedSessionViolationCount = counts['fixedSessionViolations']
+
+    # ? Soft Constraints
+    teacherAvailabilityViolationCount = counts['teacherAvailabilityViolations']
+    freeDayCount = counts['freeDays']
+    singleSessionDayCount = counts['singleSessionDays']
+    multipleCourseSessionCount = counts['multipleCourseSessions']
+    cannotCollideViolationCount = counts['cannotCollideViolations']
+    slotSpan = counts['slotSpan']
+    emptySlotCount = counts['emptySlots']
+
+    score = 50.0
+    isFeasible = False
+
+    score -= context.w1 * \
+        (semesterCollisionCount + languageSessionViolationCount)
+    score -= context.w2 * (teacherCollisionCount + multiTeacherCollisionCount)
+    score -= context.w3 * fixedSessionViolationCount
+
+    score -= context.w4 * (fridayBreakViolationCount + breakHourViolationCount +
+                           departmentMeetingViolationCount + allSlotsUsedDaysCount)
+
+    hardConstraintsTotal = sum(counts[name] for name in hardConstraintNames)
+
+    score -= context.w5 * cannotCollideViolationCount
+    score -= context.w6 * singleSessionDayCount
+    score -= context.w7 * teacherAvailabilityViolationCount
+    score -= context.w8 * multipleCourseSessionCount
+    # Total session slots (211) + Total break slots (48) + Language session length (32)
+    score -= context.w9 * (slotSpan - (291 - freeDayCount))
+    score -= context.w10 * (emptySlotCount - 5)
+    score += context.w11 * freeDayCount
+
+    if (hardConstraintsTotal):
+        score -= 0.1 * score
         isFeasible = False
+    else:
+        score += 0.2 * score
+        isFeasible = True
+
+    return isFeasible, score
+
+
+class Individual:
+    # Compact form of a schedule: 2 bytes per session on top of the shared session data
+    __slots__ = ('genome', 'fitness', 'isFeasible')
+
+    def __init__(self, genome, fitness, isFeasible):
+        self.genome = genome
+        self.fitness = fitness
+        self.isFeasible = isFeasible
+
+    def toSchedule(self, context):
+        return Schedule(context, createStateFromGenome(context, self.genome))
+
+    def printFitness(self):
+        print(
+            f'fitness: {round(self.fitness, 2)} (isFeasible: {self.isFeasible})')
+
+
+def createIndividual(schedule):
+    return Individual(encodeGenome(schedule.context, schedule.state), schedule.fitness, schedule.isFeasible)
 
-        score -= w1 * \
-            (semesterCollisionCount + languageSessionViolationCount)
-        score -= w2 * (teacherCollisionCount + multiTeacherCollisionCount)
-        score -= w3 * fixedSessionViolationCount
-
-        score -= w4 * (fridayBreakViolationCount + breakHourViolationCount +
-                       departmentMeetingViolationCount + allSlotsUsedDaysCount)
-
-        hardConstraintsTotal = (semesterCollisionCount + teacherCollisionCount +
-                                multiTeacherCollisionCount + fridayBreakViolationCount +
-                                breakHourViolationCount + departmentMeetingViolationCount +
-                                languageSessionViolationCount + allSlotsUsedDaysCount +
-                                fixedSessionViolationCount)
-
-        score -= w5 * cannotCollideViolationCount
-        score -= w6 * singleSessionDayCount
-        score -= w7 * teacherAvailabilityViolationCount
-        score -= w8 * multipleCourseSessionCount
-        # Total session slots (211) + Total break slots (48) + Language session length (32)
-        score -= w9 * (slotSpan - (291 - freeDayCount))
-        score -= w10 * (emptySlotCount - 5)
-        score += w11 * freeDayCount
-
-        if (hardConstraintsTotal):
-            score -= 0.1 * score
-            isFeasible = False
-        else:
-            score += 0.2 * score
-            isFeasible = True
 
-        return isFeasible, score
+def encodeGenome(context, state):
+    # day and hour of every session, indexed by session id
+    genome = array('b', bytes(2 * len(context.sessions)))
+    for session in state:
+        genome[2 * session.id] = session.day
+        genome[2 * session.id + 1] = session.hour
+    return genome
+
+
+def encodeSemesterGenome(context, index, semester):
+    genome = array('b', bytes(2 * context.semesterSizes[index]))
+    for session in semester:
+        position = context.semesterPositions[session.id]
+        genome[2 * position] = session.day
+        genome[2 * position + 1] = session.hour
+    return index, genome.tobytes()
+
+
+def createStateFromGenome(context, genome):
+    state = []
+    for session in context.orderedSessions:
+        state.append(Session(session.id, session.course, session.teacher, session.length,
+                             isLab=session.isLab, suffix=session.suffix, isFixed=session.isFixed,
+                             day=genome[2 * session.id], hour=genome[2 * session.id + 1]))
+    return state
+
+
+def setSlotState(obj, state):
+    # Schedules exported before the classes had __slots__ were pickled with a __dict__
+    if isinstance(state, tuple):
+        state = {**(state[0] or {}), **state[1]}
+    for key, value in state.items():
+        if key in type(obj).__slots__:
+            setattr(obj, key, value)
+
+
+def countCollisions(sessionsOfDay):
+    # Number of slots used by more than one session, same as len(findCollisions())
+    usedMask = 0
+    collisionMask = 0
+    for session in sessionsOfDay:
+        sessionMask = getSessionMask(session.hour, session.length)
+        collisionMask |= usedMask & sessionMask
+        usedMask |= sessionMask
+    return slotCounts[collisionMask]
+
+
+def groupByDay(sessionsOfRow):
+    sessionsOfDays = [[], [], [], [], []]
+    for session in sessionsOfRow:
+        sessionsOfDays[session.day].append(session)
+    return sessionsOfDays
+
+
+def findCollisions(sessionsOfDay, positions):
+    usedSlots = []
+    sessionIds = []
+    for session in sessionsOfDay:
+        hour = positions[session.id][1]
+        usedSlots.extend(
+            list(range(hour, hour + session.length)))
+        sessionIds.extend([session.id] * session.length)
+
+    collisions = []
+    collisionSlots = [
+        item for item, count in Counter(usedSlots).items() if count > 1]
+    for collisionSlot in collisionSlots:
+        indices = [index for index, slot in enumerate(
+            usedSlots) if slot == collisionSlot]
+        collisionSessions = []
+        for index in indices:
+            collisionSession = [
+                session for session in sessionsOfDay if session.id == sessionIds[index]][0]
+            collisionSessions.append(collisionSession)
+        collisions.append(collisionSessions)
+    return collisions
+
+
+def sumCells(cells):
+    return sum(sum(cellsOfRow) for cellsOfRow in cells)
+
+
+def getPositions(context, state):
+    positions = [None] * len(context.sessions)
+    for session in state:
+        positions[session.id] = (session.day, session.hour)
+    return positions
+
+
+def indexSessions(context, state):
+    sessionsById = [None] * len(context.sessions)
+    for session in state:
+        sessionsById[session.id] = session
+    return sessionsById
 
 
 def duplicateSession(session):
@@ -661,46 +943,31 @@ def createState(state):
     return [duplicateSession(session) for session in state]
 
 
-def generateObjects():
-    teachers_json, courses_json = importData()
-
+def generateObjects(problem):
     teachers = []
-    for teacher in teachers_json:
+    for teacher in problem.teacherData:
         teachers.append(Teacher(
             teacher['id'], teacher['firstName'], teacher['lastName'], teacher['unavailable']))
 
     courses = []
-    for course in courses_json:
+    for course in problem.courseData:
         courses.append(Course(course['id'], course['name'],
                               course['code'], course['department'], course['year'], course['cannotCollideWith']))
 
     sessions = []
-    index = 0
-    for course in courses_json:
-        for session in course['sessions']:
-            sessions.append(
-                Session(index, courses[course['id']], teachers[session['teacherId']],
-                        session['length'], isLab=session.get("isLab", False), suffix=session.get("suffix", None), isFixed=session.get("isFixed", False), day=session.get("day", None), hour=session.get("hour", None)))
-            index += 1
+    for session in problem.sessionData:
+        sessions.append(
+            Session(session['id'], courses[session['courseId']], teachers[session['teacherId']],
+                    session['length'], isLab=session.get("isLab", False), suffix=session.get("suffix", None), isFixed=session.get("isFixed", False), day=session.get("day", None), hour=session.get("hour", None)))
 
-    fixedSessions = [session for session in sessions if session.isFixed]
+    fixedSessions = [sessions[sessionId]
+                     for sessionId in problem.fixedSessionIds]
 
     return teachers, courses, sessions, fixedSessions
 
 
-teachers_json, courses_json = importData()
-multiTeacherCourseId, multiTeachers = getMultiTeacherCourse()
-teachers, courses, sessions, fixedSessions = generateObjects()
-constraintWeights = importConstraintWeights()
-
-w1 = constraintWeights.get('semesterCollision', 2)
-w2 = constraintWeights.get('teacherCollision', 2)
-w3 = constraintWeights.get('fixedSessionViolation', 2)
-w4 = constraintWeights.get('breakHourViolation', 3)
-w5 = constraintWeights.get('cannotCollideViolation', 0.5)
-w6 = constraintWeights.get('singleSessionDay', 0.4)
-w7 = constraintWeights.get('teacherAvailabilityViolation', 0.3)
-w8 = constraintWeights.get('multipleCourseSession', 0.2)
-w9 = constraintWeights.get('slotSpan', 0.25)
-w10 = constraintWeights.get('emptySlot', 0.15)
-w11 = constraintWeights.get('freeDay', 1)
+hardConstraintNames = ['semesterCollisions', 'teacherCollisions', 'multiTeacherCollisions', 'fridayBreakViolations',
+                       'breakHourViolations', 'departmentMeetingViolations', 'languageSessionViolations',
+                       'allSlotsUsedDays', 'fixedSessionViolations']
+violationCellNames = ['semesterCollisionCounts', 'teacherCollisionCounts', 'multiTeacherCollisionCounts',
+                      'teacherAvailabilityCounts', 'constraintCells', 'cannotCollideOverlaps', 'fixedSessionViolations']
@@ -0,0 +1,191 @@
+from classes import generateObjects
+from cache import FitnessCache
+from seeding import createConflictGraph
+from repair import getTeacherRows
+from slots import getSlotMask
+from functools import cached_property
+import copy
+import random
+
+
+# Everything a solver run depends on: the problem instance and the objects
+# built from it, the constraint weights, the evolution constants, the caches
+# and the random stream. Schedules keep the context they were created with,
+# so any number of instances and configs can be solved in one process.
+
+
+class SolverContext:
+    def __init__(self, problem, constants=None, weights=None, seed=None):
+        self.problem = problem
+        self.seed = seed
+        self.random = random.Random(seed)
+
+        self.teachers, self.courses, self.sessions, self.fixedSessions = generateObjects(
+            problem)
+        self.orderedSessions = [self.sessions[sessionId]
+                                for sessionId in problem.orderedSessionIds]
+        self.teacherIndices = {teacher.id: index for index,
+                               teacher in enumerate(self.teachers)}
+        self.multiTeacherCourseId, self.multiTeachers = problem.multiTeacherCourseId, problem.multiTeachers
+        self.cannotCollidePairs, self.cannotCollidePairsOfSession = problem.cannotCollidePairs, problem.cannotCollidePairsOfSession
+        self.semesterPositions, self.semesterSizes = problem.semesterPositions, problem.semesterSizes
+        self.sessionSemesters = problem.sessionSemesters
+        self.languageSlots = problem.languageSlots
+
+        self.unavailableMasks = [[getSlotMask(hours) for hours in teacher.unavailable]
+                                 for teacher in self.teachers]
+        self.initialAvailableMasks = [getSlotMask(hours)
+                                      for hours in problem.initialAvailableSlots]
+        self.languageMasks = [getSlotMask(hours)
+                              for hours in problem.languageSlotsOfDays]
+
+        self.createCaches()
+        self.setWeights(dict(problem.constraintWeights, **(weights or {})))
+        self.setConstants(
+            dict(problem.evolutionConstants, **(constants or {})))
+
+    def __reduce__(self):
+        # Pickled for worker processes and with exported schedules: the
+        # objects and tables are built again from the instance, the caches
+        # and the random stream start anew
+        return SolverContext, (self.problem, self.constants, self.weights, self.seed)
+
+    def __deepcopy__(self, memo):
+        # A copied schedule still belongs to the same run
+        return self
+
+    def withConstants(self, constants, seed=None):
+        # Same instance and weights with some constants replaced, and caches
+        # and a random stream of its own. The objects and tables built from
+        # the instance are shared.
+        context = copy.copy(self)
+        context.seed = seed
+        context.random = random.Random(seed)
+        context.createCaches()
+        context.setConstants(dict(self.constants, **constants))
+        return context
+
+    def createCaches(self):
+        self.fitnessCache = FitnessCache('Fitness cache')
+        self.semesterCache = FitnessCache('Semester cache')
+        self.caches = [self.fitnessCache, self.semesterCache]
+
+    def resetCaches(self):
+        self.fitnessCache.reset(self.FITNESS_CACHE_SIZE)
+        self.semesterCache.reset(self.SEMESTER_CACHE_SIZE)
+
+    @cached_property
+    def conflictGraph(self):
+        return createConflictGraph(self, self.orderedSessions, self.cannotCollidePairs)
+
+    @cached_property
+    def feasibilityGraph(self):
+        return createConflictGraph(self, self.orderedSessions, [])
+
+    @cached_property
+    def teacherRows(self):
+        return {session.id: getTeacherRows(self, session) for session in self.sessions}
+
+    def setWeights(self, weights):
+        self.weights = weights
+
+        self.w1 = weights.get('semesterCollision', 2)
+        self.w2 = weights.get('teacherCollision', 2)
+        self.w3 = weights.get('fixedSessionViolation', 2)
+        self.w4 = weights.get('breakHourViolation', 3)
+        self.w5 = weights.get('cannotCollideViolation', 0.5)
+        self.w6 = weights.get('singleSessionDay', 0.4)
+        self.w7 = weights.get('teacherAvailabilityViolation', 0.3)
+        self.w8 = weights.get('multipleCourseSession', 0.2)
+        self.w9 = weights.get('slotSpan', 0.25)
+        self.w10 = weights.get('emptySlot', 0.15)
+        self.w11 = weights.get('freeDay', 1)
+
+    def setConstants(self, constants):
+        self.constants = constants
+
+        self.SIZE = constants.get('SIZE', 100)
+        self.STAGNATION_LIMIT = constants.get('STAGNATION_LIMIT', 75)
+        self.ELITE_SIZE = constants.get('ELITE_SIZE', 12)
+
+        # 0: random / 1: corrective / 2: hybrid / 3: smart
+        self.MUTATION_TYPE = constants.get('MUTATION_TYPE', 3)
+
+        self.MUTATION_RATE_1 = constants.get('MUTATION_RATE_1', 0.1)
+        self.MUTATION_RATE_2 = constants.get('MUTATION_RATE_2', 0.2)
+        self.MUTATION_RATE_3 = constants.get('MUTATION_RATE_3', 0.3)
+
+        self.STAGNATION_THRESHOLD_1 = constants.get('STAGNATION_THRESHOLD_1', 15)
+        self.STAGNATION_THRESHOLD_2 = constants.get('STAGNATION_THRESHOLD_2', 35)
+
+        self.GENERATION_THRESHOLD_1 = constants.get('GENERATION_THRESHOLD_1', 50)
+        self.GENERATION_THRESHOLD_2 = constants.get('GENERATION_THRESHOLD_2', 100)
+        self.CROSSOVER_RATE = constants.get('CROSSOVER_RATE', 0.5)
+        # Moves the sessions that break a hard constraint after a crossover to the
+        # nearest valid slot of their semester (see repair.py)
+        self.CROSSOVER_REPAIR = constants.get('CROSSOVER_REPAIR', False)
+
+        self.GENERATION_LIMIT = constants.get('GENERATION_LIMIT', 1000)
+        # Seconds evolution() may take including the initial population, 0 for no limit
+        self.TIME_LIMIT_SECONDS = constants.get('TIME_LIMIT_SECONDS', 0)
+        # Every new best schedule is saved to output/ under this name, empty to disable
+        self.CHECKPOINT_NAME = constants.get('CHECKPOINT_NAME', 'best')
+
+        # 1: single process / n: initialisation, crossover and mutation spread over n worker processes
+        self.WORKERS = constants.get('WORKERS', 1)
+        # Schedules created by one worker task during parallel initialisation
+        self.INITIALISATION_BATCH_SIZE = constants.get('INITIALISATION_BATCH_SIZE', 25)
+
+        # Maximum number of evaluated genomes remembered per context, 0 to disable
+        self.FITNESS_CACHE_SIZE = constants.get('FITNESS_CACHE_SIZE', 10000)
+        # Semester-local constraint results remembered per context, 0 to disable
+        self.SEMESTER_CACHE_SIZE = constants.get('SEMESTER_CACHE_SIZE', 10000)
+
+        # Island model (see islands.py): one entry of constant overrides per island, empty to disable
+        self.ISLANDS = constants.get('ISLANDS', [])
+        self.MIGRATION_INTERVAL = constants.get('MIGRATION_INTERVAL', 10)
+        self.MIGRATION_SIZE = constants.get('MIGRATION_SIZE', 2)
+        # ring / full
+        self.MIGRATION_TOPOLOGY = constants.get('MIGRATION_TOPOLOGY', 'ring')
+
+        # 1: greedy / 2: hybrid / 3: hybrid mixed with graph colouring schedules (see seeding.py)
+        self.INITIALISATION_METHOD = constants.get('INITIALISATION_METHOD', 2)
+        # Share of the initial population created by graph colouring with INITIALISATION_METHOD 3
+        self.SEEDED_RATIO = constants.get('SEEDED_RATIO', 0.5)
+
+        # roulette: fitness proportional / tournament: fittest of TOURNAMENT_SIZE random picks
+        self.SELECTION_METHOD = constants.get('SELECTION_METHOD', 'roulette')
+        self.TOURNAMENT_SIZE = constants.get('TOURNAMENT_SIZE', 3)
+        # sort / heap: heapq.nlargest / partition: numpy.argpartition, all give the same elites
+        self.ELITE_EXTRACTION = constants.get('ELITE_EXTRACTION', 'heap')
+
+        # Moves of the hill climbing on elite1 per generation, 0 to disable
+        self.LOCAL_SEARCH_BUDGET = constants.get('LOCAL_SEARCH_BUDGET', 0)
+
+        # Schedules without hard constraint violations from the backtracking solver
+        # (see solver.py) added to the initial population, and the limits of each search
+        self.SOLVER_SEEDS = constants.get('SOLVER_SEEDS', 0)
+        self.SOLVER_NODE_LIMIT = constants.get('SOLVER_NODE_LIMIT', 100000)
+        self.SOLVER_TIME_LIMIT = constants.get('SOLVER_TIME_LIMIT', 10)
+
+        # genetic / annealing / tabu (see trajectory.py)
+        self.ENGINE = constants.get('ENGINE', 'genetic')
+        self.TRAJECTORY_STEPS = constants.get('TRAJECTORY_STEPS', 20000)
+        self.TRAJECTORY_STAGNATION_LIMIT = constants.get('TRAJECTORY_STAGNATION_LIMIT', 5000)
+        self.TRAJECTORY_REPORT_INTERVAL = constants.get('TRAJECTORY_REPORT_INTERVAL', 500)
+        # Mutation operators used as the neighbourhood, same values as MUTATION_TYPE
+        self.TRAJECTORY_MUTATION_TYPE = constants.get('TRAJECTORY_MUTATION_TYPE', 2)
+        # geometric / linear / lundy
+        self.ANNEALING_COOLING = constants.get('ANNEALING_COOLING', 'geometric')
+        self.ANNEALING_INITIAL_TEMPERATURE = constants.get('ANNEALING_INITIAL_TEMPERATURE', 2)
+        self.ANNEALING_FINAL_TEMPERATURE = constants.get('ANNEALING_FINAL_TEMPERATURE', 0.01)
+        # Steps a left position stays forbidden, and neighbours compared per step
+        self.TABU_TENURE = constants.get('TABU_TENURE', 20)
+        self.TABU_NEIGHBOURS = constants.get('TABU_NEIGHBOURS', 10)
+
+        # Name of a schedule in output/ to re-optimise for the current data (see
+        # warmstart.py), '' to start from random schedules. The share of the initial
+        # population made of perturbations of it and the mutations per perturbation.
+        self.WARM_START_SCHEDULE = constants.get('WARM_START_SCHEDULE', '')
+        self.WARM_START_RATIO = constants.get('WARM_START_RATIO', 0.5)
+        self.WARM_START_MUTATIONS = constants.get('WARM_START_MUTATIONS', 2)
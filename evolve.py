@@ -1,155 +1,186 @@
-from classes import Teacher, Session, Course, Schedule, teachers, courses, sessions
+from classes import Teacher, Session, Course, Schedule, createIndividual, createState, Individual
 from utils import *
+from slots import *
 from export import *
+from seeding import generateSeededSchedule
+from solver import solveFeasibility
+from repair import repairChild
+from functools import cached_property
 import copy
-import random
+import heapq
+import multiprocessing
 import time
+import numpy as np
 
 
 PRINT_GENERATION = False
 
 
-def generateInitialSemesterSchedule(semester):
-    semester = copy.deepcopy(semester)
-    available = copy.deepcopy(initialAvailableSlots)
-
-    fixedSessions = [session for session in semester if session.isFixed]
-
-    if fixedSessions:
-        for fixedSession in fixedSessions:
-            available[fixedSession.day] = [x for x in available[fixedSession.day]
-                                           if x not in list(range(fixedSession.hour, fixedSession.hour + fixedSession.length))]
-
-    availableDays = [i for (i, x) in enumerate(available) if x]
-    scheduledSessions = []
-    shuffledSemester = random.sample(semester, len(semester))
+def generateInitialSemesterSchedule(context, semester):
+    semester = createState(semester)
+    availableMasks = list(context.initialAvailableMasks)
 
     for session in semester:
         if session.isFixed:
-            scheduledSessions.append(session)
+            takeSlots(availableMasks, session.day, session.hour, session.length)
+
+    # The longest sessions are placed first, they have the fewest starts left
+    for session in sorted(semester, key=lambda session: -session.length):
+        if session.isFixed:
             continue
 
-        day, hour = selectAvailableDayAndHour(
-            available, availableDays, session)
+        day, hour = selectAvailableDayAndHour(context, availableMasks, session)
 
         if day is not False:
             session.day = day
             session.hour = hour
-            available[day] = [x for x in available[day]
-                              if x not in list(range(hour, hour + session.length))]
-            availableDays = [i for (i, x) in enumerate(available) if x]
-
-            scheduledSessions.append(session)
+            takeSlots(availableMasks, day, hour, session.length)
 
         else:
             return False
 
-    return scheduledSessions
+    return semester
 
 
-def selectAvailableDayAndHour(available, availableDays, session):
-    count = 0
+def takeSlots(availableMasks, day, hour, length):
+    sessionMask = getSessionMask(hour, length)
+    availableMasks[day] &= ~sessionMask
+    # Only one of 12.00 and 13.00 may be used on Monday, Tuesday and Thursday
+    if day in [0, 1, 3] and sessionMask & BREAK_MASK:
+        availableMasks[day] &= ~BREAK_MASK
 
-    while True:
-        day = random.choice(availableDays)
-        hour = random.choice(available[day])
-        slots = list(range(hour, hour + session.length))
 
-        if 12 in slots and 13 in slots:
-            count += 1
+def selectAvailableDayAndHour(context, availableMasks, session):
+    placements = [(day, hour) for day, mask in enumerate(availableMasks)
+                  for hour in startHours[session.length][mask]]
+
+    if placements:
+        return context.random.choice(placements)
+
+    if context.INITIALISATION_METHOD == 1:
+        return False, False
+    if context.INITIALISATION_METHOD in [2, 3]:
+        return selectRandomDayAndHour(context, availableMasks, session)
 
-        else:
-            isAllAvailable = all(x in available[day] for x in slots)
-            if (isAllAvailable):
-                return day, hour
-            count += 1
-
-        if count > 50:
-            if INITIALISATION_METHOD == 1:
-                return False, False
-            if INITIALISATION_METHOD == 2:
-                return selectRandomDayAndHour(available, availableDays, session)
-
-
-def selectRandomDayAndHour(available, availableDays, session):
-    while True:
-        day = random.choice(availableDays)
-        length = session.length
-        if length == 2:
-            availableFor2 = [
-                slot for slot in available[day] if slot != 17]
-            if availableFor2:
-                hour = random.choice(availableFor2)
-            else:
-                continue
-        else:
-            availableFor3 = [
-                slot for slot in available[day] if slot not in [16, 17]]
-            if availableFor3:
-                hour = random.choice(availableFor3)
-            else:
-                continue
 
-        return day, hour
+def selectRandomDayAndHour(context, availableMasks, session):
+    # The session may collide with others, but it still ends by 18.00
+    placements = [(day, hour) for day, mask in enumerate(availableMasks)
+                  for hour in slotHours[mask] if hour + session.length <= FIRST_HOUR + SLOT_COUNT]
+    return context.random.choice(placements)
 
 
-def generateRandomSchedule():
+def generateRandomSchedule(context):
     semesters = []
 
     for department in range(2):
         for year in range(1, 5):
             semester = list(filter(lambda session: session.course.department ==
-                                   department and session.course.year == year, sessions))
+                                   department and session.course.year == year, context.sessions))
             found = False
 
             while found == False or len(found) == 0:
-                found = generateInitialSemesterSchedule(semester)
+                found = generateInitialSemesterSchedule(context, semester)
             semesters.extend(found)
 
-    schedule = Schedule(semesters)
+    schedule = Schedule(context, semesters)
 
     return schedule
 
 
-def generatePopulation(size):
-    return [generateRandomSchedule() for _ in range(size)]
+def generateSolverSeeds(context, count, deadline=None):
+    # Every search gets at most the time left before the deadline
+    seeds = []
+    for _ in range(count):
+        timeLimit = context.SOLVER_TIME_LIMIT if deadline is None else min(
+            context.SOLVER_TIME_LIMIT, deadline - time.time())
+        if timeLimit <= 0:
+            break
+        seeds.append(solveFeasibility(
+            context, context.SOLVER_NODE_LIMIT, timeLimit, context.random.getrandbits(32)))
+    return [schedule for schedule in seeds if schedule]
+
+
+def generatePopulation(context, size, deadline=None):
+    return generateSchedules(context, size, countSeededSchedules(context, size), deadline)
+
+
+def generateSchedules(context, size, seededCount, deadline=None):
+    # Stops early at the deadline, with at least one schedule
+    population = []
+    for index in range(size):
+        if population and deadline is not None and time.time() > deadline:
+            break
+        population.append(generateSeededSchedule(context)
+                          if index < seededCount else generateRandomSchedule(context))
+    return population
 
 
-def performCrossover(schedule1, schedule2):
-    index = random.choice(range(8))
+def countSeededSchedules(context, size):
+    return round(size * context.SEEDED_RATIO) if context.INITIALISATION_METHOD == 3 else 0
+
+
+def performCrossover(context, schedule1, schedule2):
+    index = context.random.choice(range(8))
     schedule1.semesters[index], schedule2.semesters[index] = schedule2.semesters[index], schedule1.semesters[index]
 
-    newSchedule1 = Schedule(getStateFromSemesters(schedule1))
-    newSchedule2 = Schedule(getStateFromSemesters(schedule2))
+    if context.CROSSOVER_REPAIR:
+        # Repaired on copies, the sessions still belong to the parents
+        newSchedule1 = repairChild(context, getStateFromSemesters(schedule1))
+        newSchedule2 = repairChild(context, getStateFromSemesters(schedule2))
+    else:
+        newSchedule1 = Schedule(context, getStateFromSemesters(schedule1))
+        newSchedule2 = Schedule(context, getStateFromSemesters(schedule2))
 
     return [newSchedule1, newSchedule2]
 
 
-def selection(population, size, elite2):
-    if INITIALISATION_METHOD == 1:
-        scores = [max(schedule.fitness, 1) for schedule in population]
+def selection(context, population, size, elite2):
+    if context.SELECTION_METHOD == 'tournament':
+        # All contestants are drawn at once, TOURNAMENT_SIZE per pick
+        contestants = context.random.choices(population, k=size * context.TOURNAMENT_SIZE)
+        selected = [max(contestants[index:index + context.TOURNAMENT_SIZE], key=lambda schedule: schedule.fitness)
+                    for index in range(0, len(contestants), context.TOURNAMENT_SIZE)]
     else:
-        sortedPopulation = sorted(
-            population, key=lambda schedule: schedule.fitness)
-        worstFitness = sortedPopulation[0].fitness
-        offset = 0 - worstFitness
-        scores = [schedule.fitness + offset for schedule in population]
-
-    selected = random.choices(population, scores, k=size)
-    selected.extend(elite2)
-    return random.sample(selected, len(selected))
+        if context.INITIALISATION_METHOD == 1:
+            scores = [max(schedule.fitness, 1) for schedule in population]
+        else:
+            worstFitness = min(schedule.fitness for schedule in population)
+            offset = 0 - worstFitness
+            scores = [schedule.fitness + offset for schedule in population]
 
+        selected = context.random.choices(population, scores, k=size)
 
-def crossover(population, size):
+    selected.extend(elite2)
+    return context.random.sample(selected, len(selected))
+
+
+def getElites(context, population, size):
+    # The size fittest schedules, best first, in the order a stable sort by
+    # fitness would give them
+    if context.ELITE_EXTRACTION == 'sort':
+        return sorted(population, key=lambda schedule: schedule.fitness, reverse=True)[:size]
+    if context.ELITE_EXTRACTION == 'partition' and size < len(population):
+        fitnesses = np.array([schedule.fitness for schedule in population])
+        kthFitness = fitnesses[np.argpartition(-fitnesses, size - 1)[size - 1]]
+        above = np.flatnonzero(fitnesses > kthFitness)
+        tied = np.flatnonzero(fitnesses == kthFitness)[:size - len(above)]
+        indices = np.concatenate([above, tied])
+        indices = indices[np.lexsort((indices, -fitnesses[indices]))]
+        return [population[index] for index in indices]
+    return heapq.nlargest(size, population, key=lambda schedule: schedule.fitness)
+
+
+def crossover(context, population, size):
     newPopulation = []
 
     for index in range(size//2):
-        willCrossover = random.choices(
-            [True, False], [CROSSOVER_RATE, 1-CROSSOVER_RATE], k=1)
+        willCrossover = context.random.choices(
+            [True, False], [context.CROSSOVER_RATE, 1-context.CROSSOVER_RATE], k=1)
 
         if willCrossover:
             newSchedules = performCrossover(
-                population[index * 2], population[index * 2 + 1])
+                context, population[index * 2], population[index * 2 + 1])
             newPopulation.extend(newSchedules)
         else:
             newPopulation.append(population[index * 2])
@@ -159,7 +190,7 @@ def crossover(population, size):
 
 
 def safeMutation(schedule):
-    n = random.choice(range(3))
+    n = schedule.context.random.choice(range(3))
     if n == 0:
         return mutateBySwapingSessions(schedule)
     if n == 1:
@@ -169,7 +200,7 @@ def safeMutation(schedule):
 
 
 def correctiveMutation(schedule):
-    n = random.choice(range(6))
+    n = schedule.context.random.choice(range(6))
     if n == 0:
         return mutateByMovingPeriod(schedule)
     if n == 1:
@@ -185,7 +216,7 @@ def correctiveMutation(schedule):
 
 
 def hybridMutation(schedule):
-    n = random.choice(range(9))
+    n = schedule.context.random.choice(range(9))
     if n == 0:
         return mutateByMovingPeriod(schedule)
     if n == 1:
@@ -207,7 +238,7 @@ def hybridMutation(schedule):
 
 
 def smartMutation1(schedule):
-    n = random.choice(range(2))
+    n = schedule.context.random.choice(range(2))
     if n == 0:
         return mutateByMovingPeriod(schedule)
     if n == 1:
@@ -215,7 +246,7 @@ def smartMutation1(schedule):
 
 
 def smartMutation2(schedule):
-    n = random.choice(range(7))
+    n = schedule.context.random.choice(range(7))
     if n == 0:
         return mutateByMovingSingleSessions(schedule)
     if n == 1:
@@ -232,30 +263,38 @@ def smartMutation2(schedule):
         return mutateByMovingSessionVertically(schedule)
 
 
-def performMutation(schedule):
-    if MUTATION_TYPE == 0:
-        return safeMutation(schedule)
+def performMutation(schedule, mutationType=None):
+    # The corrective operators return None when the schedule has no violation
+    # of their kind: the smart mutation then tries the operators of
+    # smartMutation2 instead, the other types keep the schedule
+    mutationType = schedule.context.MUTATION_TYPE if mutationType is None else mutationType
+    mutated = None
 
-    if MUTATION_TYPE == 1:
-        return correctiveMutation(schedule)
+    if mutationType == 0:
+        mutated = safeMutation(schedule)
 
-    if MUTATION_TYPE == 2:
-        return hybridMutation(schedule)
+    if mutationType == 1:
+        mutated = correctiveMutation(schedule)
 
-    if MUTATION_TYPE == 3:
+    if mutationType == 2:
+        mutated = hybridMutation(schedule)
+
+    if mutationType == 3:
         if not schedule.isFeasible:
-            return smartMutation1(schedule)
+            mutated = smartMutation1(schedule)
         else:
-            return smartMutation2(schedule)
+            mutated = smartMutation2(schedule)
+        while mutated is None:
+            mutated = smartMutation2(schedule)
+
+    return schedule if mutated is None else mutated
 
 
 def mutateByMovingPeriod(schedule):
     if schedule.breakHourViolations:
-        semester, day = random.choice(schedule.breakHourViolations)
+        semester, day = schedule.context.random.choice(schedule.breakHourViolations)
     else:
-        if MUTATION_TYPE == 3:
-            return smartMutation2(schedule)
-        return schedule
+        return None
 
     availableSlotsOfDay = schedule.availableSlots[semester][day]
     morningSlots = [
@@ -278,7 +317,7 @@ def mutateByMovingPeriod(schedule):
         eveningPossible = [slot for slot in range(
             12, eveningSlots[-1] + 1) if slot in startTime]
 
-    period = random.randint(0, 1)
+    period = schedule.context.random.randint(0, 1)
 
     if period == 0 and morningPossible:
         toMutate = [
@@ -292,7 +331,7 @@ def mutateByMovingPeriod(schedule):
         for session in toMutate:
             if session.hour > 9:
                 session.hour -= 1
-        return Schedule(schedule.state)
+        return schedule.withMovedSessions(toMutate)
 
     if period == 1 and eveningPossible:
         toMutate = [
@@ -306,28 +345,27 @@ def mutateByMovingPeriod(schedule):
         for session in toMutate:
             if session.hour + session.length < 18:
                 session.hour += 1
-        return Schedule(schedule.state)
+        return schedule.withMovedSessions(toMutate)
 
     return schedule
 
 
 def mutateBySwapingSessionsOfTeacher(schedule):
     if schedule.teacherCollisions:
-        collision = random.choice(schedule.teacherCollisions)
+        collision = schedule.context.random.choice(schedule.teacherCollisions)
     else:
-        if MUTATION_TYPE == 3:
-            return smartMutation2(schedule)
-        return schedule
+        return None
 
     for collidedSession in collision:
         swapableSessions = [session for session in schedule.state if isSafeToSwapTeacherCollision(
             session, collidedSession)]
 
         if swapableSessions:
-            sessionToSwap = random.choice(swapableSessions)
+            sessionToSwap = schedule.context.random.choice(swapableSessions)
             collidedSession.day, sessionToSwap.day = sessionToSwap.day, collidedSession.day
             collidedSession.hour, sessionToSwap.hour = sessionToSwap.hour, collidedSession.hour
-            newSchedule = Schedule(schedule.state)
+            newSchedule = schedule.withMovedSessions(
+                [collidedSession, sessionToSwap])
 
             return newSchedule
 
@@ -336,21 +374,20 @@ def mutateBySwapingSessionsOfTeacher(schedule):
 
 def mutateBySwapingSessionsThatCannotCollide(schedule):
     if schedule.cannotCollideViolations:
-        collision = random.choice(schedule.cannotCollideViolations)
+        collision = schedule.context.random.choice(schedule.cannotCollideViolations)
     else:
-        if MUTATION_TYPE == 3:
-            return smartMutation2(schedule)
-        return schedule
+        return None
 
     for collidedSession in collision:
         swapableSessions = [session for session in schedule.state if isSafeToSwapTeacherCollision(
             session, collidedSession)]
 
         if swapableSessions:
-            sessionToSwap = random.choice(swapableSessions)
+            sessionToSwap = schedule.context.random.choice(swapableSessions)
             collidedSession.day, sessionToSwap.day = sessionToSwap.day, collidedSession.day
             collidedSession.hour, sessionToSwap.hour = sessionToSwap.hour, collidedSession.hour
-            newSchedule = Schedule(schedule.state)
+            newSchedule = schedule.withMovedSessions(
+                [collidedSession, sessionToSwap])
 
             return newSchedule
 
@@ -373,14 +410,12 @@ def isSafeToSwapTeacherCollision(session, collidedSession):
 def mutateByMovingSingleSessions(schedule):
 
     if schedule.singleSessionDays:
-        semesterIndex, day = random.choice(schedule.singleSessionDays)
+        semesterIndex, day = schedule.context.random.choice(schedule.singleSessionDays)
     else:
-        if MUTATION_TYPE == 3:
-            return smartMutation2(schedule)
-        return schedule
+        return None
 
     semester = schedule.semesters[semesterIndex]
-    if day in languageSlots[0]:
+    if day in schedule.context.languageSlots[0]:
         return schedule
 
     sessions = [session for session in semester if session.day == day]
@@ -409,34 +444,33 @@ def mutateByMovingSingleSessions(schedule):
         if daySlots:
             allPossibleDays.append(day)
 
-    chosenDay = random.choice(allPossibleDays)
-    chosenSlot = random.choice(possibleSlots[chosenDay])
+    chosenDay = schedule.context.random.choice(allPossibleDays)
+    chosenSlot = schedule.context.random.choice(possibleSlots[chosenDay])
 
     session.day = chosenDay
     session.hour = chosenSlot
 
-    newSchedule = Schedule(schedule.state)
+    newSchedule = schedule.withMovedSessions([session])
 
     return newSchedule
 
 
 def mutateBySwapingSessionsOfCourse(schedule):
     if schedule.multipleCourseSessions:
-        sessionsOfCourse = random.choice(schedule.multipleCourseSessions)
+        sessionsOfCourse = schedule.context.random.choice(schedule.multipleCourseSessions)
     else:
-        if MUTATION_TYPE == 3:
-            return smartMutation2(schedule)
-        return schedule
+        return None
 
     for sessionOfCourse in sessionsOfCourse:
         swapableSessions = [session for session in schedule.state if isSafeToSwapMultipleSessions(
             session, sessionOfCourse)]
 
         if swapableSessions:
-            sessionToSwap = random.choice(swapableSessions)
+            sessionToSwap = schedule.context.random.choice(swapableSessions)
             sessionOfCourse.day, sessionToSwap.day = sessionToSwap.day, sessionOfCourse.day
             sessionOfCourse.hour, sessionToSwap.hour = sessionToSwap.hour, sessionOfCourse.hour
-            newSchedule = Schedule(schedule.state)
+            newSchedule = schedule.withMovedSessions(
+                [sessionOfCourse, sessionToSwap])
 
             return newSchedule
 
@@ -457,11 +491,9 @@ def isSafeToSwapMultipleSessions(session, sessionOfCourse):
 
 def mutateBySlidingSessions(schedule):
     if schedule.emptySlots:
-        emptySlot = random.choice(schedule.emptySlots)
+        emptySlot = schedule.context.random.choice(schedule.emptySlots)
     else:
-        if MUTATION_TYPE == 3:
-            return smartMutation2(schedule)
-        return schedule
+        return None
 
     semester = schedule.semesters[emptySlot[0]]
     sessionsOfDay = [
@@ -480,22 +512,23 @@ def mutateBySlidingSessions(schedule):
     else:
         return schedule
 
-    return Schedule(schedule.state)
+    return schedule.withMovedSessions(sessionsOfDay)
 
 
 def mutateBySwapingSessions(schedule):
     for _ in range(10):
-        chosenSemester = random.choice(schedule.semesters)
-        chosenSession = random.choice(chosenSemester)
+        chosenSemester = schedule.context.random.choice(schedule.semesters)
+        chosenSession = schedule.context.random.choice(chosenSemester)
 
         swapableSessions = [session for session in chosenSemester
                             if isSafeToRandomlySwapSessions(session, chosenSession, schedule.availableSlots)]
 
         if swapableSessions:
-            sessionToSwap = random.choice(swapableSessions)
+            sessionToSwap = schedule.context.random.choice(swapableSessions)
             chosenSession.day, sessionToSwap.day = sessionToSwap.day, chosenSession.day
             chosenSession.hour, sessionToSwap.hour = sessionToSwap.hour, chosenSession.hour
-            newSchedule = Schedule(schedule.state)
+            newSchedule = schedule.withMovedSessions(
+                [chosenSession, sessionToSwap])
             return newSchedule
     return schedule
 
@@ -531,11 +564,12 @@ def isSafeToRandomlySwapSessions(session, sessionToSwap, availableSlots):
 
 def mutateByMovingSessionsIntoEmptySpaces(schedule):
     for _ in range(10):
-        chosenSession = random.choice(schedule.state)
+        chosenSession = schedule.context.random.choice(schedule.state)
         if chosenSession.isFixed:
             continue
-        availableSlots = getSemesterSlotsOfSession(chosenSession, schedule)
-        consecutive = getConsecutiveSlots(availableSlots)
+        availableSlotMasks = schedule.availableSlotMasks[getSemesterIndex(
+            chosenSession.course.department, chosenSession.course.year)]
+        consecutive = [consecutiveSlots[mask] for mask in availableSlotMasks]
 
         possible = []
         for dayIndex, day in enumerate(consecutive):
@@ -544,25 +578,22 @@ def mutateByMovingSessionsIntoEmptySpaces(schedule):
                     possible.append((dayIndex, groupIndex))
 
         if possible:
-            chosenPeriodIndex = random.choice(possible)
+            chosenPeriodIndex = schedule.context.random.choice(possible)
 
             chosenDay = chosenPeriodIndex[0]
             chosenGroup = chosenPeriodIndex[1]
             chosenPeriod = consecutive[chosenDay][chosenGroup]
 
             possibleHours = chosenPeriod[:-(chosenSession.length-1)]
-            chosenHour = random.choice(possibleHours)
-            chosenSlots = list(
-                range(chosenHour, chosenHour + chosenSession.length))
+            chosenHour = schedule.context.random.choice(possibleHours)
 
-            availableSlotsOfChosen = availableSlots[chosenDay]
-            slotsAfterMutation = [
-                slot for slot in availableSlotsOfChosen if slot not in chosenSlots]
+            slotsAfterMutation = availableSlotMasks[chosenDay] & ~getSessionMask(
+                chosenHour, chosenSession.length)
 
-            if chosenDay in [2, 4] or 12 in slotsAfterMutation or 13 in slotsAfterMutation:
+            if chosenDay in [2, 4] or slotsAfterMutation & BREAK_MASK:
                 chosenSession.day = chosenDay
                 chosenSession.hour = chosenHour
-                newSchedule = Schedule(schedule.state)
+                newSchedule = schedule.withMovedSessions([chosenSession])
                 return newSchedule
             else:
                 continue
@@ -572,37 +603,35 @@ def mutateByMovingSessionsIntoEmptySpaces(schedule):
 
 def mutateByMovingSessionVertically(schedule):
     for _ in range(10):
-        chosenSession = random.choice(schedule.state)
+        chosenSession = schedule.context.random.choice(schedule.state)
         if chosenSession.isFixed:
             continue
 
-        availableSlots = getSemesterSlotsOfSession(chosenSession, schedule)
+        availableSlotMasks = schedule.availableSlotMasks[getSemesterIndex(
+            chosenSession.course.department, chosenSession.course.year)]
 
-        slotsOfDay = availableSlots[chosenSession.day]
-        slotsOfSession = list(
-            range(chosenSession.hour, chosenSession.hour + chosenSession.length))
+        slotsOfDay = availableSlotMasks[chosenSession.day]
+        slotsOfSession = getSessionMask(
+            chosenSession.hour, chosenSession.length)
 
-        possible = getBorderingSlots(slotsOfDay, slotsOfSession)
+        possible = getBorderingSlotsOfMask(slotsOfDay, slotsOfSession)
 
         if possible:
-            chosenHour = random.choice(possible)
+            chosenHour = schedule.context.random.choice(possible)
             if chosenHour < chosenSession.hour:
                 candidate = chosenHour
 
             if chosenHour > chosenSession.hour:
-                difference = chosenHour - slotsOfSession[-1]
+                difference = chosenHour - \
+                    (chosenSession.hour + chosenSession.length - 1)
                 candidate = chosenSession.hour + difference
 
-            newSlotsOfSession = list(
-                range(candidate, candidate + chosenSession.length))
-
-            allSlots = slotsOfDay + slotsOfSession
-            newAllSlots = [
-                slot for slot in allSlots if slot not in newSlotsOfSession]
+            newAllSlots = (slotsOfDay | slotsOfSession) & ~getSessionMask(
+                candidate, chosenSession.length)
 
-            if chosenSession.day in [2, 4] or 12 in newAllSlots or 13 in newAllSlots:
+            if chosenSession.day in [2, 4] or newAllSlots & BREAK_MASK:
                 chosenSession.hour = candidate
-                newSchedule = Schedule(schedule.state)
+                newSchedule = schedule.withMovedSessions([chosenSession])
                 return newSchedule
             else:
                 continue
@@ -610,11 +639,11 @@ def mutateByMovingSessionVertically(schedule):
     return schedule
 
 
-def mutation(population, mutationRate):
+def mutation(context, population, mutationRate):
     newPopulation = []
 
     for schedule in population:
-        willMutate = random.choices(
+        willMutate = context.random.choices(
             [True, False], [mutationRate, 1-mutationRate], k=1)
 
         if willMutate:
@@ -625,6 +654,179 @@ def mutation(population, mutationRate):
     return newPopulation
 
 
+def improveElites(context, elites, budget):
+    # Memetic stage: first improvement hill climbing on every elite with an
+    # equal share of the moves of the generation. elite1 is empty with an
+    # ELITE_SIZE below 2.
+    if not elites:
+        return elites
+    isCompact = isinstance(elites[0], Individual)
+    schedules = [elite.toSchedule(context) if isCompact else elite for elite in elites]
+    budgetOfSchedule = max(budget // len(schedules), 1)
+
+    improved = [climbHill(schedule, budgetOfSchedule)
+                for schedule in schedules]
+    improved.sort(key=lambda schedule: schedule.fitness, reverse=True)
+    return [createIndividual(schedule) if isCompact else schedule for schedule in improved]
+
+
+def climbHill(schedule, budget):
+    while budget > 0:
+        for sessions in generateLocalMoves(schedule):
+            budget -= 1
+            candidate = tryLocalMove(schedule, sessions)
+            if candidate.fitness > schedule.fitness:
+                schedule = candidate
+                break
+            if budget <= 0:
+                break
+        else:
+            # No improving move left: local optimum
+            break
+    return schedule
+
+
+def generateLocalMoves(schedule):
+    # Yields lists of (session, day, hour) changes: the swaps that remove a
+    # teacher collision first, then the other swaps within a semester and the
+    # moves of single sessions into free slots of their semester, in random order
+    collided = {session.id for collision in schedule.teacherCollisions
+                for session in collision}
+    teacherCollisionSwaps = []
+    moves = []
+
+    for index, semester in enumerate(schedule.semesters):
+        for position, session in enumerate(semester):
+            if session.isFixed:
+                continue
+
+            for other in semester[position + 1:]:
+                if other.isFixed or session.course.id == other.course.id or \
+                        not isSafeToRandomlySwapSessions(session, other, schedule.availableSlots):
+                    continue
+                swap = [(session, other.day, other.hour),
+                        (other, session.day, session.hour)]
+                if (session.id in collided and isSafeToSwapTeacherCollision(other, session)) or \
+                        (other.id in collided and isSafeToSwapTeacherCollision(session, other)):
+                    teacherCollisionSwaps.append(swap)
+                else:
+                    moves.append(swap)
+
+            for day, availableMask in enumerate(schedule.availableSlotMasks[index]):
+                if day == session.day:
+                    availableMask |= getSessionMask(session.hour, session.length)
+                for hour in startHours[session.length][availableMask]:
+                    if (day, hour) != (session.day, session.hour):
+                        moves.append([(session, day, hour)])
+
+    schedule.context.random.shuffle(teacherCollisionSwaps)
+    schedule.context.random.shuffle(moves)
+    yield from teacherCollisionSwaps
+    yield from moves
+
+
+def tryLocalMove(schedule, changes):
+    # The sessions of the schedule are moved for the delta evaluation and put
+    # back afterwards, so the schedule itself stays unchanged
+    positions = [(session, session.day, session.hour)
+                 for session, _, _ in changes]
+    for session, day, hour in changes:
+        session.day = day
+        session.hour = hour
+
+    candidate = schedule.withMovedSessions(
+        [session for session, _, _ in changes])
+
+    for session, day, hour in positions:
+        session.day = day
+        session.hour = hour
+    return candidate
+
+
+def createWorkerPool(context, workers=None):
+    return multiprocessing.Pool(workers or context.WORKERS, initializer=initialiseWorker,
+                                initargs=(context,))
+
+
+def initialiseWorker(context):
+    # Every worker process keeps the context of its pool, with caches of its own
+    global workerContext
+    workerContext = context
+    context.resetCaches()
+
+
+def getCacheCountersSince(context, counters):
+    return [[new - old for new, old in zip(cache.getCounters(), countersOfCache)]
+            for cache, countersOfCache in zip(context.caches, counters)]
+
+
+def addCacheCounters(context, results):
+    # Every worker has its own caches, the counters are summed up here
+    for _, counters in results:
+        for cache, countersOfCache in zip(context.caches, counters):
+            cache.addCounters(countersOfCache)
+
+
+def generateIndividuals(size, seededCount, seed):
+    # Runs in a worker, every batch has its own random stream
+    context = workerContext
+    context.random.seed(seed)
+    counters = [cache.getCounters() for cache in context.caches]
+    individuals = [createIndividual(schedule)
+                   for schedule in generateSchedules(context, size, seededCount)]
+    return individuals, getCacheCountersSince(context, counters)
+
+
+def parallelPopulation(context, pool, size, deadline=None):
+    # The batches do not depend on WORKERS, so a seeded run creates the same
+    # population with any number of workers. The batches not done by the
+    # deadline are dropped, the pool has to be terminated then.
+    seededCount = countSeededSchedules(context, size)
+    batches = [(min(context.INITIALISATION_BATCH_SIZE, size - index), max(0, min(context.INITIALISATION_BATCH_SIZE, seededCount - index)),
+                context.random.getrandbits(32)) for index in range(0, size, context.INITIALISATION_BATCH_SIZE)]
+    pending = [pool.apply_async(generateIndividuals, batch)
+               for batch in batches]
+    results = []
+    for result in pending:
+        try:
+            results.append(result.get(
+                None if deadline is None else max(deadline - time.time(), 0)))
+        except multiprocessing.TimeoutError:
+            break
+    addCacheCounters(context, results)
+
+    return [individual for batch, _ in results for individual in batch]
+
+
+def breedOffspring(individuals, mutationRate, seed):
+    # Runs in a worker: individuals travel as compact genomes, not Schedule objects
+    context = workerContext
+    context.random.seed(seed)
+    counters = [cache.getCounters() for cache in context.caches]
+    population = [individual.toSchedule(context) for individual in individuals]
+    population = crossover(context, population, len(population))
+    population = mutation(context, population, mutationRate)
+    return [createIndividual(schedule) for schedule in population], getCacheCountersSince(context, counters)
+
+
+def parallelCrossoverAndMutation(context, pool, population, size, mutationRate):
+    population = population[:size - size % 2]
+    batchSize = -(-len(population) // (context.WORKERS * 4))
+    batchSize += batchSize % 2
+
+    batches = [(population[index:index + batchSize], mutationRate, context.random.getrandbits(32))
+               for index in range(0, len(population), batchSize)]
+    offspring = pool.starmap(breedOffspring, batches)
+    addCacheCounters(context, offspring)
+
+    return [individual for batch, _ in offspring for individual in batch]
+
+
+def isOutOfTime(context, time0, generationTime):
+    # Stops while the longest generation so far still fits before the deadline
+    return bool(context.TIME_LIMIT_SECONDS) and time.time() + generationTime - time0 > context.TIME_LIMIT_SECONDS
+
+
 def printInitilaPopulationFitness(population):
     sortedPopulation = sorted(
         population, key=lambda schedule: schedule.fitness, reverse=True)
@@ -638,26 +840,101 @@ def printInitilaPopulationFitness(population):
     print(f'Average: {average}')
 
 
-def printPopulationFitness(population, generation, stagnation, bestNonElite, bestSoFar, mutationRate, showAll=False):
-    print(f'\nGENERATION {generation + 1}')
+def printPopulationFitness(snapshot, showAll=False):
+    print(f'\nGENERATION {snapshot.generation + 1}')
 
     if showAll:
-        for schedule in population:
+        for schedule in sorted(snapshot.population, key=lambda schedule: schedule.fitness, reverse=True):
             schedule.printFitness()
 
-    average = sum([schedule.fitness for schedule in population]
-                  ) / len(population)
+    print(f'Average: {round(snapshot.averageFitness, 2)}')
+    print(f'Best of Generation: {round(snapshot.bestNonElite.fitness, 2)}')
+    print(f'Best So Far: {round(snapshot.bestFitness, 2)}', end=' ')
+    print('FEASIBLE') if snapshot.isFeasible else print('NON-FEASIBLE')
+    print(
+        f'stagnation = {snapshot.stagnation}, mutation_rate = {snapshot.mutationRate}')
+
+
+class GenerationSnapshot:
+    # State of the evolution after a generation, generation -1 being the
+    # initial population. Statistics over the whole population are only
+    # calculated when a reporter reads them.
+    def __init__(self, context, generation, population, bestSoFar, bestNonElite, stagnation, mutationRate,
+                 initialisationTime, elapsed, generationTime):
+        self.context = context
+        self.generation = generation
+        self.population = population
+        self.bestSoFar = bestSoFar
+        self.bestNonElite = bestNonElite
+        self.stagnation = stagnation
+        self.mutationRate = mutationRate
+        self.initialisationTime = initialisationTime
+        self.elapsed = elapsed
+        self.generationTime = generationTime
+
+    @property
+    def bestFitness(self):
+        return self.bestSoFar.fitness
+
+    @property
+    def isFeasible(self):
+        return self.bestSoFar.isFeasible
+
+    @cached_property
+    def averageFitness(self):
+        return sum(schedule.fitness for schedule in self.population) / len(self.population)
+
+    @cached_property
+    def bestSchedule(self):
+        # With worker processes the population consists of Individuals
+        if isinstance(self.bestSoFar, Individual):
+            return self.bestSoFar.toSchedule(self.context)
+        return self.bestSoFar
+
+
+class PrintReporter:
+    def __init__(self, showAll=False):
+        self.showAll = showAll
+
+    def report(self, snapshot):
+        if snapshot.generation < 0:
+            printInitilaPopulationFitness(snapshot.population)
+        else:
+            printPopulationFitness(snapshot, self.showAll)
+
+    def finish(self, snapshot):
+        best = snapshot.bestSchedule
+        exportSchedule(
+            best, name=f'{round(best.fitness, 2)}, {snapshot.context.STAGNATION_LIMIT}, {snapshot.context.SIZE}')
+        best.printInfo()
+
+        generations = snapshot.generation + 1
+        print(
+            f'\nPopulation initialisation:\t{snapshot.initialisationTime}\nEvoluton total time:\t\t{snapshot.elapsed}')
+        print(
+            f'Time per generation:\t\t{snapshot.elapsed/max(generations, 1)}')
+        for cache in snapshot.context.caches:
+            cache.printStats()
+
 
-    print(f'Average: {round(average, 2)}')
-    print(f'Best of Generation: {round(bestNonElite.fitness, 2)}')
-    print(f'Best So Far: {round(bestSoFar.fitness, 2)}', end=' ')
-    print('FEASIBLE') if bestSoFar.isFeasible else print('NON-FEASIBLE')
-    print(f'stagnation = {stagnation}, mutation_rate = {mutationRate}')
+class HistoryReporter:
+    # Collects (seconds, generation, best fitness) of every generation
+    def __init__(self, history):
+        self.history = history
 
+    def report(self, snapshot):
+        if snapshot.generation >= 0:
+            self.history.append(
+                (snapshot.elapsed, snapshot.generation, snapshot.bestFitness))
 
-def evolution():
-    bestScore = float('-inf')
-    bestSoFar = None
+    def finish(self, snapshot):
+        pass
+
+
+def evolutionSteps(context, migrate=None, seeds=None):
+    # Yields a GenerationSnapshot for the initial population and after every
+    # generation. The caller may stop at any time, the last snapshot holds
+    # the best schedule so far.
     stagnation = 0
     generation = 0
 
@@ -666,101 +943,137 @@ def evolution():
     hasReachedGenerationThreshold1 = False
     hasReachedGenerationThreshold2 = False
 
-    mutationRate = MUTATION_RATE_1
-
-    time0 = time.time()
-    population = generatePopulation(SIZE)
-    time1 = time.time()
-
-    printInitilaPopulationFitness(population)
-
-    sortedPopulation = sorted(
-        population, key=lambda schedule: schedule.fitness, reverse=True)
-
-    elite1 = sortedPopulation[:ELITE_SIZE//2]
-    elite2 = sortedPopulation[ELITE_SIZE//2:ELITE_SIZE]
-
-    while stagnation <= STAGNATION_LIMIT and generation <= GENERATION_LIMIT:
-
-        population = selection(population, SIZE - ELITE_SIZE, elite2)
-        population = crossover(population, SIZE - ELITE_SIZE//2)
-        population = mutation(population, mutationRate)
-
-        bestNonElite = sorted(
-            population, key=lambda schedule: schedule.fitness, reverse=True)[0]
-
-        population.extend(elite1)
-
-        sortedPopulation = sorted(
-            population, key=lambda schedule: schedule.fitness, reverse=True)
-
-        elite1 = sortedPopulation[:ELITE_SIZE//2]
-        elite2 = sortedPopulation[ELITE_SIZE//2:ELITE_SIZE]
+    mutationRate = context.MUTATION_RATE_1
+
+    context.resetCaches()
+    pool = createWorkerPool(context) if context.WORKERS > 1 else None
+
+    try:
+        time0 = time.time()
+        # The initialisation also stops at the deadline, with a smaller population
+        deadline = time0 + context.TIME_LIMIT_SECONDS if context.TIME_LIMIT_SECONDS else None
+        # Given schedules and the ones of the feasibility solver replace random ones
+        seeds = (list(seeds or []) +
+                 generateSolverSeeds(context, context.SOLVER_SEEDS, deadline))[:context.SIZE]
+        if pool:
+            population = [createIndividual(schedule) for schedule in seeds]
+            population.extend(parallelPopulation(
+                context, pool, context.SIZE - len(seeds), deadline))
+            if not population:
+                population = [createIndividual(
+                    generatePopulation(context, 1)[0])]
+        else:
+            population = seeds + \
+                generatePopulation(context, context.SIZE - len(seeds), deadline)
+        time1 = time.time()
+
+        elites = getElites(context, population, max(context.ELITE_SIZE, 1))
+        elite1 = elites[:context.ELITE_SIZE//2]
+        elite2 = elites[context.ELITE_SIZE//2:context.ELITE_SIZE]
+
+        bestSoFar = copy.deepcopy(elites[0])
+        bestScore = bestSoFar.fitness
+        if context.CHECKPOINT_NAME:
+            saveCheckpoint(bestSoFar.toSchedule(context)
+                           if pool else bestSoFar, context.CHECKPOINT_NAME)
+
+        yield GenerationSnapshot(context, -1, population, bestSoFar, elites[0], stagnation, mutationRate,
+                                 time1 - time0, 0, 0)
+
+        generationTime = 0
+
+        while stagnation <= context.STAGNATION_LIMIT and generation <= context.GENERATION_LIMIT and \
+                not isOutOfTime(context, time0, generationTime):
+            timeOfGeneration = time.time()
+
+            population = selection(
+                context, population, context.SIZE - context.ELITE_SIZE, elite2)
+            if pool:
+                population = parallelCrossoverAndMutation(
+                    context, pool, population, context.SIZE - context.ELITE_SIZE//2, mutationRate)
+            else:
+                population = crossover(
+                    context, population, context.SIZE - context.ELITE_SIZE//2)
+                population = mutation(context, population, mutationRate)
 
-        bestOfGeneration = sortedPopulation[0]
+            bestNonElite = max(
+                population, key=lambda schedule: schedule.fitness)
 
-        if bestOfGeneration.fitness > bestScore:
-            bestScore = bestOfGeneration.fitness
-            bestSoFar = copy.deepcopy(bestOfGeneration)
-            stagnation = 0
+            population.extend(elite1)
 
-        if not hasReachedStagnationThreshold1 and stagnation >= STAGNATION_THRESHOLD_1:
-            hasReachedStagnationThreshold1 = True
-            mutationRate = MUTATION_RATE_2
+            if migrate:
+                population = migrate(generation, population)
 
-        if not hasReachedStagnationThreshold2 and stagnation >= STAGNATION_THRESHOLD_2:
-            hasReachedStagnationThreshold1 = True
-            mutationRate = MUTATION_RATE_3
+            elites = getElites(context, population, max(context.ELITE_SIZE, 1))
+            elite1 = elites[:context.ELITE_SIZE//2]
+            elite2 = elites[context.ELITE_SIZE//2:context.ELITE_SIZE]
 
-        if not hasReachedGenerationThreshold1 and generation >= GENERATION_THRESHOLD_1:
-            hasReachedGenerationThreshold1 = True
-            mutationRate = MUTATION_RATE_2
+            if context.LOCAL_SEARCH_BUDGET:
+                elite1 = improveElites(
+                    context, elite1, context.LOCAL_SEARCH_BUDGET)
 
-        if not hasReachedGenerationThreshold2 and generation >= GENERATION_THRESHOLD_2:
-            hasReachedGenerationThreshold2 = True
-            mutationRate = MUTATION_RATE_3
+            bestOfGeneration = elite1[0] if elite1 else elites[0]
 
-        printPopulationFitness(
-            sortedPopulation, generation, stagnation, bestNonElite, bestSoFar, mutationRate, showAll=PRINT_GENERATION)
+            if bestOfGeneration.fitness > bestScore:
+                bestScore = bestOfGeneration.fitness
+                bestSoFar = copy.deepcopy(bestOfGeneration)
+                stagnation = 0
 
-        stagnation += 1
-        generation += 1
+                if context.CHECKPOINT_NAME:
+                    saveCheckpoint(bestSoFar.toSchedule(context)
+                                   if pool else bestSoFar, context.CHECKPOINT_NAME)
 
-    time2 = time.time()
+            if not hasReachedStagnationThreshold1 and stagnation >= context.STAGNATION_THRESHOLD_1:
+                hasReachedStagnationThreshold1 = True
+                mutationRate = context.MUTATION_RATE_2
 
-    exportSchedule(
-        bestSoFar, name=f'{round(bestSoFar.fitness, 2)}, {STAGNATION_LIMIT}, {SIZE}')
-    bestSoFar.printInfo()
+            if not hasReachedStagnationThreshold2 and stagnation >= context.STAGNATION_THRESHOLD_2:
+                hasReachedStagnationThreshold1 = True
+                mutationRate = context.MUTATION_RATE_3
 
-    print(
-        f'\nPopulation initialisation:\t{time1-time0}\nEvoluton total time:\t\t{time2-time1}')
-    print(
-        f'Time per generation:\t\t{(time2-time1)/generation}')
+            if not hasReachedGenerationThreshold1 and generation >= context.GENERATION_THRESHOLD_1:
+                hasReachedGenerationThreshold1 = True
+                mutationRate = context.MUTATION_RATE_2
 
-    return bestSoFar
+            if not hasReachedGenerationThreshold2 and generation >= context.GENERATION_THRESHOLD_2:
+                hasReachedGenerationThreshold2 = True
+                mutationRate = context.MUTATION_RATE_3
 
+            yield GenerationSnapshot(context, generation, population, bestSoFar, bestNonElite, stagnation, mutationRate,
+                                     time1 - time0, time.time() - time1, generationTime)
 
-constants = importEvolutionConstants()
+            stagnation += 1
+            generation += 1
+            generationTime = max(
+                generationTime, time.time() - timeOfGeneration)
 
-SIZE = constants.get('SIZE', 100)
-STAGNATION_LIMIT = constants.get('STAGNATION_LIMIT', 75)
-ELITE_SIZE = constants.get('ELITE_SIZE', 12)
+    finally:
+        if pool:
+            # Terminated, initialisation batches dropped at the deadline may
+            # still be running
+            pool.terminate()
+            pool.join()
 
-# 0: random / 1: corrective / 2: hybrid / 3: smart
-MUTATION_TYPE = constants.get('MUTATION_TYPE', 3)
 
-MUTATION_RATE_1 = constants.get('MUTATION_RATE_1', 0.1)
-MUTATION_RATE_2 = constants.get('MUTATION_RATE_2', 0.2)
-MUTATION_RATE_3 = constants.get('MUTATION_RATE_3', 0.3)
+def evolution(context, migrate=None, report=True, seeds=None, history=None, reporters=None):
+    # Runs evolutionSteps to the end: reporters get every snapshot through
+    # report(snapshot) and the last one through finish(snapshot)
+    reporters = list(reporters or [])
+    if report:
+        reporters.append(PrintReporter(showAll=PRINT_GENERATION))
+    if history is not None:
+        reporters.append(HistoryReporter(history))
 
-STAGNATION_THRESHOLD_1 = constants.get('STAGNATION_THRESHOLD_1', 15)
-STAGNATION_THRESHOLD_2 = constants.get('STAGNATION_THRESHOLD_2', 35)
+    steps = evolutionSteps(context, migrate, seeds)
+    try:
+        for snapshot in steps:
+            for reporter in reporters:
+                reporter.report(snapshot)
+    finally:
+        steps.close()
 
-GENERATION_THRESHOLD_1 = constants.get('GENERATION_THRESHOLD_1', 50)
-GENERATION_THRESHOLD_2 = constants.get('GENERATION_THRESHOLD_2', 100)
-CROSSOVER_RATE = constants.get('CROSSOVER_RATE', 0.5)
+    for reporter in reporters:
+        reporter.finish(snapshot)
 
-GENERATION_LIMIT = constants.get('GENERATION_LIMIT', 1000)
+    return snapshot.bestSchedule
 
-# 1: greedy / 2: hybrid
-INITIALISATION_METHOD = 2
@@ -1,7 +1,9 @@
 import pickle
-import openpyxl
 import os
-from utils import languageSlots
+import threading
+from problem import loadProblem
+from context import SolverContext
+from utils import getSemesterIndex, getSemesterShortName
 
 
 def exportSchedule(schedule, name='latest'):
@@ -10,16 +12,56 @@ def exportSchedule(schedule, name='latest'):
     dbfile.close()
 
 
-def importSchedule(name='latest', info=False):
+def saveCheckpoint(schedule, name='best'):
+    # The schedule is written to a temporary file and renamed, so output/{name}
+    # always holds a whole schedule even if the process is killed while writing.
+    # Processes and threads saving the same name write their own temporary files.
+    temporaryName = f'output/.{name}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(temporaryName, 'wb') as dbfile:
+        pickle.dump(schedule, dbfile)
+        dbfile.flush()
+        os.fsync(dbfile.fileno())
+    os.replace(temporaryName, f'output/{name}')
+
+
+def importSchedule(name='latest', info=False, context=None):
     dbfile = open(f'output/{name}', 'rb')
     schedule = pickle.load(dbfile)
     dbfile.close()
+    # Schedules exported before they kept their context belong to the given
+    # one, or to the instance in ./data
+    if 'context' not in vars(schedule):
+        schedule.context = context or SolverContext(loadProblem())
     if info:
         schedule.printInfo()
     return schedule
 
 
+def scheduleToDict(schedule):
+    # JSON compatible form of a schedule, the sessions ordered by id
+    return {
+        'fitness': schedule.fitness,
+        'isFeasible': schedule.isFeasible,
+        'violations': schedule.countViolations(),
+        'sessions': [{
+            'id': session.id,
+            'code': session.course.code,
+            'name': session.name,
+            'teacher': f'{session.teacher.firstName} {session.teacher.lastName}',
+            'semester': getSemesterShortName(getSemesterIndex(session.course.department, session.course.year)),
+            'day': session.day,
+            'hour': session.hour,
+            'length': session.length,
+            'isFixed': session.isFixed,
+        } for session in sorted(schedule.state, key=lambda session: session.id)]
+    }
+
+
 def saveToExcel(schedule, openFile=False, filename=None):
+    # openpyxl takes longer to import than the rest of the program, so only
+    # the processes that write Excel files import it
+    import openpyxl
+    languageSlots = schedule.context.languageSlots
     wb = openpyxl.load_workbook("template.xlsx")
     sheets = wb.sheetnames
 
@@ -66,6 +108,7 @@ def saveToExcel(schedule, openFile=False, filename=None):
 
 
 def setBorder(ws):
+    import openpyxl
     thick = openpyxl.styles.Side(border_style="thick", color="000000")
 
     for row in ws['B18:G18']:
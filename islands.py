@@ -0,0 +1,135 @@
+from classes import createIndividual
+from export import exportSchedule
+import evolve
+import multiprocessing
+import queue
+import time
+
+
+def getMigrationTargets(context, index, islandCount):
+    if context.MIGRATION_TOPOLOGY == 'full':
+        return [target for target in range(islandCount) if target != index]
+    return [(index + 1) % islandCount] if islandCount > 1 else []
+
+
+def runIsland(context, index, overrides, inboxes, events, seed):
+    # Every island is its own process with the island constants replacing the
+    # ones of the context
+    checkpointName = overrides.get('CHECKPOINT_NAME', context.CHECKPOINT_NAME)
+    if checkpointName:
+        checkpointName = f'{checkpointName}, island {index}'
+    context = context.withConstants(
+        dict(overrides, WORKERS=1, CHECKPOINT_NAME=checkpointName), seed)
+
+    targets = getMigrationTargets(context, index, len(inboxes))
+    for target in targets:
+        inboxes[target].cancel_join_thread()
+
+    progress = {'generation': 0}
+
+    def migrate(generation, population):
+        progress['generation'] = generation + 1
+        if (generation + 1) % context.MIGRATION_INTERVAL:
+            return population
+
+        sortedPopulation = sorted(
+            population, key=lambda schedule: schedule.fitness, reverse=True)
+        emigrants = [createIndividual(schedule)
+                     for schedule in sortedPopulation[:context.MIGRATION_SIZE]]
+        for target in targets:
+            inboxes[target].put(emigrants)
+
+        immigrants = []
+        while True:
+            try:
+                immigrants.extend(inboxes[index].get_nowait())
+            except queue.Empty:
+                break
+
+        # Immigrants replace the worst individuals of the island
+        immigrants = immigrants[:len(sortedPopulation)]
+        population = sortedPopulation[:len(sortedPopulation) - len(immigrants)]
+        population.extend(individual.toSchedule(context)
+                          for individual in immigrants)
+
+        events.put(('progress', index, generation, sortedPopulation[0].fitness,
+                    sortedPopulation[0].isFeasible, len(immigrants)))
+        return population
+
+    time0 = time.time()
+    best = evolve.evolution(context, migrate=migrate, report=False)
+    events.put(('result', index, createIndividual(best),
+               progress['generation'], time.time() - time0))
+
+
+def printIslandProgress(index, generation, fitness, isFeasible, immigrantCount):
+    print(f'Island {index}: generation {generation + 1}, best of generation: {round(fitness, 2)}', end=' ')
+    print('FEASIBLE', end=' ') if isFeasible else print('NON-FEASIBLE', end=' ')
+    print(f'({immigrantCount} immigrants)')
+
+
+def printIslandSummary(results, best):
+    print('\n\n---------- ISLANDS ----------\n')
+    for index in sorted(results):
+        individual, generations, elapsed = results[index]
+        print(f'Island {index}: {round(individual.fitness, 2)}', end=' ')
+        print('FEASIBLE', end=' ') if individual.isFeasible else print(
+            'NON-FEASIBLE', end=' ')
+        print(f'({generations} generations, {round(elapsed, 2)} s)')
+    print(f'\nBest of all islands: {round(best.fitness, 2)}', end=' ')
+    print('FEASIBLE') if best.isFeasible else print('NON-FEASIBLE')
+
+
+def islandEvolution(context, islands=None, report=True):
+    islands = islands if islands is not None else context.ISLANDS
+    if not islands:
+        raise ValueError('ISLANDS must contain at least one island')
+
+    inboxes = [multiprocessing.Queue() for _ in islands]
+    events = multiprocessing.Queue()
+    processes = []
+
+    time0 = time.time()
+    for index, overrides in enumerate(islands):
+        process = multiprocessing.Process(target=runIsland, args=(
+            context, index, overrides, inboxes, events, context.random.getrandbits(32)))
+        process.start()
+        processes.append(process)
+
+    results = {}
+    while len(results) < len(islands):
+        try:
+            event = events.get(timeout=1)
+        except queue.Empty:
+            failed = [index for index, process in enumerate(processes)
+                      if process.exitcode not in (None, 0) and index not in results]
+            if failed:
+                for process in processes:
+                    process.terminate()
+                raise RuntimeError(f'Island {failed[0]} stopped unexpectedly')
+            continue
+
+        if event[0] == 'progress':
+            if report:
+                printIslandProgress(*event[1:])
+        else:
+            index, individual, generations, elapsed = event[1:]
+            results[index] = (individual, generations, elapsed)
+
+    for process in processes:
+        process.join()
+    time1 = time.time()
+
+    bestIndividual = max((individual for individual, _, _ in results.values()),
+                         key=lambda individual: individual.fitness)
+    bestSoFar = bestIndividual.toSchedule(context)
+
+    if report:
+        exportSchedule(
+            bestSoFar, name=f'{round(bestSoFar.fitness, 2)}, islands {len(islands)}')
+        bestSoFar.printInfo()
+        printIslandSummary(results, bestSoFar)
+
+        print(f'\nIsland evolution total time:\t{time1-time0}')
+
+    return bestSoFar
@@ -1,12 +1,11 @@
-from utils import *
-from evolve import *
+from api import solve
 from export import *
 import cProfile
 
 
 def main():
 
-    best = evolution()
+    best = solve('./data', report=True)
     saveToExcel(best, openFile=True)
     # imported = importSchedule(name='Problem2', info=True)
 
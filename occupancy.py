@@ -0,0 +1,219 @@
+from classes import calculateScore
+from slots import FIRST_HOUR, SLOT_COUNT
+import numpy as np
+
+
+def getSlotIndex(hour):
+    return hour - FIRST_HOUR
+
+
+def createSlotMask(slotsOfDays):
+    mask = np.zeros((5, SLOT_COUNT), dtype=bool)
+    for day, slots in enumerate(slotsOfDays):
+        for slot in slots:
+            if FIRST_HOUR <= slot < FIRST_HOUR + SLOT_COUNT:
+                mask[day, getSlotIndex(slot)] = True
+    return mask
+
+
+class OccupancyTables:
+    # The per session arrays and slot masks of the instance of a context
+    def __init__(self, context):
+        self.context = context
+        sessions = context.sessions
+
+        self.sessionSemesters = np.array(context.sessionSemesters, dtype=np.int64)
+        self.sessionTeachers = np.array(
+            [context.teacherIndices[session.teacher.id] for session in sessions], dtype=np.int64)
+        self.sessionCourses = np.array(
+            [session.course.id for session in sessions], dtype=np.int64)
+        self.sessionLengths = np.array(
+            [session.length for session in sessions], dtype=np.int64)
+        self.teacherCount = len(context.teachers)
+        self.courseCount = len(context.courses)
+
+        self.fixedSessionIds = np.array(
+            [session.id for session in context.fixedSessions], dtype=np.int64)
+        self.fixedSessionDays = np.array(
+            [session.day for session in context.fixedSessions], dtype=np.int64)
+
+        self.multiTeacherIndices = np.array(
+            [context.teacherIndices[teacherId] for teacherId in context.multiTeachers], dtype=np.int64)
+        self.multiTeacherSessionIds = np.array([min(
+            session.id for session in sessions if session.course.id == context.multiTeacherCourseId)], dtype=np.int64)
+
+        self.cannotCollidePairIds = np.array(
+            [pair[:2] for pair in context.cannotCollidePairs], dtype=np.int64).reshape(-1, 2)
+
+        self.unavailableMask = np.array(
+            [createSlotMask(teacher.unavailable) for teacher in context.teachers])
+        self.availableMask = createSlotMask(
+            context.problem.initialAvailableSlots)
+        self.languageMask = createSlotMask(
+            context.problem.languageSlotsOfDays)
+
+
+def encodeSchedule(schedule):
+    sessionCount = len(schedule.context.sessions)
+    days = np.zeros(sessionCount, dtype=np.int64)
+    hours = np.zeros(sessionCount, dtype=np.int64)
+    for session in schedule.state:
+        days[session.id] = session.day
+        hours[session.id] = session.hour
+    return days, hours
+
+
+def encodePopulation(context, population):
+    days = np.zeros((len(population), len(context.sessions)), dtype=np.int64)
+    hours = np.zeros((len(population), len(context.sessions)), dtype=np.int64)
+    for index, schedule in enumerate(population):
+        days[index], hours[index] = encodeSchedule(schedule)
+    return days, hours
+
+
+def calculateOccupancy(rows, days, hours, lengths, size):
+    # rows, days and hours are (population x sessions), lengths is per session
+    occupancy = np.zeros(
+        (days.shape[0], size, 5, SLOT_COUNT), dtype=np.int64)
+    individuals = np.broadcast_to(
+        np.arange(days.shape[0])[:, None], days.shape)
+    rows = np.broadcast_to(rows, days.shape)
+    for offset in range(lengths.max()):
+        isInSession = np.broadcast_to(offset < lengths, days.shape)
+        np.add.at(occupancy, (individuals[isInSession], rows[isInSession], days[isInSession],
+                              getSlotIndex(hours[isInSession]) + offset), 1)
+    return occupancy
+
+
+def countPopulationViolations(tables, days, hours):
+    sessionSemesters, sessionLengths = tables.sessionSemesters, tables.sessionLengths
+    availableMask, languageMask = tables.availableMask, tables.languageMask
+    multiTeacherSessionIds = tables.multiTeacherSessionIds
+
+    semesterOccupancy = calculateOccupancy(
+        sessionSemesters, days, hours, sessionLengths, 8)
+    teacherOccupancy = calculateOccupancy(
+        tables.sessionTeachers, days, hours, sessionLengths, tables.teacherCount)
+
+    used = semesterOccupancy > 0
+    usedHour12 = used[..., getSlotIndex(12)]
+    usedHour13 = used[..., getSlotIndex(13)]
+
+    sessionCounts = countSessionsOfDays(sessionSemesters, days, 8)
+    courseCounts = countSessionsOfDays(
+        tables.sessionCourses, days, tables.courseCount)
+
+    hasSessions = used.any(axis=-1)
+    isLanguageDay = languageMask.any(axis=-1)
+
+    # Slot span and empty slots count the language block as used
+    usedWithLanguage = used | languageMask
+    hasUsedSlots = usedWithLanguage.any(axis=-1)
+    earliest = usedWithLanguage.argmax(axis=-1)
+    latest = SLOT_COUNT - 1 - usedWithLanguage[..., ::-1].argmax(axis=-1)
+    slotSpan = np.where(hasUsedSlots, latest - earliest + 1, 0)
+
+    available = availableMask & ~used
+    slotIndices = np.arange(SLOT_COUNT)
+    dayRange = hasUsedSlots[..., None] & (slotIndices >= earliest[..., None]) & \
+        (slotIndices <= latest[..., None]) & available
+    emptySlots = dayRange.sum(axis=-1) - \
+        (dayRange[..., getSlotIndex(12)] | dayRange[..., getSlotIndex(13)])
+
+    multiTeacherOccupancy = teacherOccupancy[:, tables.multiTeacherIndices] + \
+        calculateOccupancy(np.zeros(1, dtype=np.int64), days[:, multiTeacherSessionIds],
+                           hours[:, multiTeacherSessionIds], sessionLengths[multiTeacherSessionIds], 1)
+
+    first, second = tables.cannotCollidePairIds[:, 0], tables.cannotCollidePairIds[:, 1]
+    cannotCollide = (days[:, first] == days[:, second]) & \
+        (hours[:, first] < hours[:, second] + sessionLengths[second]) & \
+        (hours[:, second] < hours[:, first] + sessionLengths[first])
+
+    def total(violations):
+        return violations.reshape(violations.shape[0], -1).sum(axis=1)
+
+    return {
+        'semesterCollisions': total(semesterOccupancy > 1),
+        'languageSessionViolations': total((used & languageMask).any(axis=-1)),
+        'teacherCollisions': total(teacherOccupancy > 1),
+        'multiTeacherCollisions': total(multiTeacherOccupancy > 1),
+        'breakHourViolations': total((usedHour12 & usedHour13)[..., breakDays]),
+        'fridayBreakViolations': total((usedHour12 | usedHour13)[..., 4]),
+        'departmentMeetingViolations': total(usedHour13[..., 2]),
+        'allSlotsUsedDays': total((~available.any(axis=-1))[..., breakDays]),
+        'fixedSessionViolations': total(days[:, tables.fixedSessionIds] != tables.fixedSessionDays),
+        'teacherAvailabilityViolations': total(teacherOccupancy * tables.unavailableMask),
+        'freeDays': total(~hasSessions & ~isLanguageDay),
+        'singleSessionDays': total(((sessionCounts == 1) & singleSessionDayMask) |
+                                   ((sessionCounts == 0) & isLanguageDay)),
+        'multipleCourseSessions': total(courseCounts > 1),
+        'cannotCollideViolations': total(cannotCollide),
+        'slotSpan': total(slotSpan),
+        'emptySlots': total(emptySlots),
+    }
+
+
+def countSessionsOfDays(rows, days, size):
+    counts = np.zeros((days.shape[0], size, 5), dtype=np.int64)
+    individuals = np.broadcast_to(
+        np.arange(days.shape[0])[:, None], days.shape)
+    np.add.at(counts, (individuals, np.broadcast_to(rows, days.shape), days), 1)
+    return counts
+
+
+def calculateScores(context, counts):
+    # Same operations as calculateScore, applied to a whole population at once
+    hardConstraintsTotal = (counts['semesterCollisions'] + counts['teacherCollisions'] +
+                            counts['multiTeacherCollisions'] + counts['fridayBreakViolations'] +
+                            counts['breakHourViolations'] + counts['departmentMeetingViolations'] +
+                            counts['languageSessionViolations'] + counts['allSlotsUsedDays'] +
+                            counts['fixedSessionViolations'])
+
+    score = np.full(len(hardConstraintsTotal), 50.0)
+    score -= context.w1 * \
+        (counts['semesterCollisions'] + counts['languageSessionViolations'])
+    score -= context.w2 * (counts['teacherCollisions'] +
+                   counts['multiTeacherCollisions'])
+    score -= context.w3 * counts['fixedSessionViolations']
+    score -= context.w4 * (counts['fridayBreakViolations'] + counts['breakHourViolations'] +
+                   counts['departmentMeetingViolations'] + counts['allSlotsUsedDays'])
+    score -= context.w5 * counts['cannotCollideViolations']
+    score -= context.w6 * counts['singleSessionDays']
+    score -= context.w7 * counts['teacherAvailabilityViolations']
+    score -= context.w8 * counts['multipleCourseSessions']
+    score -= context.w9 * (counts['slotSpan'] - (291 - counts['freeDays']))
+    score -= context.w10 * (counts['emptySlots'] - 5)
+    score += context.w11 * counts['freeDays']
+
+    isFeasible = hardConstraintsTotal == 0
+    score = np.where(isFeasible, score + 0.2 * score, score - 0.1 * score)
+    return isFeasible, score
+
+
+def evaluatePopulation(tables, days, hours):
+    # days and hours are (population x sessions) gene matrices indexed by session id
+    counts = countPopulationViolations(
+        tables, np.asarray(days, dtype=np.int64), np.asarray(hours, dtype=np.int64))
+    isFeasible, fitness = calculateScores(tables.context, counts)
+    return fitness, isFeasible, counts
+
+
+def countViolations(tables, days, hours):
+    counts = countPopulationViolations(
+        tables, np.asarray(days, dtype=np.int64)[None], np.asarray(hours, dtype=np.int64)[None])
+    return {key: int(count[0]) for key, count in counts.items()}
+
+
+def calculateFitness(tables, schedule):
+    return calculateScore(tables.context, countViolations(tables, *encodeSchedule(schedule)))
+
+
+def crossCheck(tables, schedule):
+    # Returns the counts that differ between the list based and the array based evaluation
+    expected = schedule.countViolations()
+    actual = countViolations(tables, *encodeSchedule(schedule))
+    return {key: (expected[key], actual[key]) for key in expected if expected[key] != actual[key]}
+
+
+breakDays = [0, 1, 3]
+singleSessionDayMask = np.isin(np.arange(5), [0, 3, 4])
@@ -0,0 +1,180 @@
+from utils import importData, importFixed, importLanguageSessions, importConstraintWeights, importEvolutionConstants, \
+    getLanguageSlots, calculateAvailableSlots, getMultiTeacherCourse, getSemesterIndex
+import hashlib
+import os
+import pickle
+import threading
+
+
+# Everything read from the data directory and the static indices derived from
+# it. The compiled instance is pickled next to the JSON files and reused until
+# one of them changes, so short lived processes skip the parsing.
+DATA_FILES = ['teachers.json', 'courses.json', 'fixedSlots.json', 'languageSlots.json',
+              'constraintWeights.json', 'evolutionConstants.json']
+CACHE_FILE = '.problem.cache'
+CACHE_VERSION = 2
+
+
+class ProblemError(ValueError):
+    pass
+
+
+class ProblemInstance:
+    def __init__(self, directory='./data'):
+        self.teacherData, self.courseData = importData(directory)
+        self.fixedSlots = importFixed(directory)
+        self.languageSlots = importLanguageSessions(directory)
+        self.constraintWeights = importConstraintWeights(directory)
+        self.evolutionConstants = importEvolutionConstants(directory)
+
+        self.validate()
+
+        self.sessionData = []
+        for course in self.courseData:
+            for session in course['sessions']:
+                self.sessionData.append(
+                    dict(session, id=len(self.sessionData), courseId=course['id']))
+        self.multiTeacherCourseId, self.multiTeachers = getMultiTeacherCourse(
+            self.courseData)
+        self.languageSlotsOfDays = getLanguageSlots(self.languageSlots)
+        self.initialAvailableSlots = calculateAvailableSlots(
+            self.fixedSlots, self.languageSlotsOfDays)
+
+        self.sessionSemesters = [self.getSemesterOfSession(session)
+                                 for session in self.sessionData]
+        self.orderedSessionIds = sorted(range(len(self.sessionData)), key=lambda sessionId: (
+            self.sessionSemesters[sessionId], sessionId))
+        self.semesterPositions, self.semesterSizes = self.calculateSemesterPositions()
+        self.fixedSessionIds = [session['id']
+                                for session in self.sessionData if session.get('isFixed', False)]
+        self.cannotCollidePairs, self.cannotCollidePairsOfSession = self.calculateCannotCollidePairs()
+
+    def getSemesterOfSession(self, session):
+        course = self.courseData[session['courseId']]
+        return getSemesterIndex(course['department'], course['year'])
+
+    def validate(self):
+        for index, teacher in enumerate(self.teacherData):
+            if teacher['id'] != index:
+                raise ProblemError(f'teachers.json: teacher {index} has the id {teacher["id"]}')
+            if len(teacher['unavailable']) != 5:
+                raise ProblemError(f'teachers.json: teacher {index} needs 5 days of unavailable hours')
+
+        courseIds = range(len(self.courseData))
+        for index, course in enumerate(self.courseData):
+            if course['id'] != index:
+                raise ProblemError(f'courses.json: course {index} has the id {course["id"]}')
+            if course['department'] not in [0, 1] or course['year'] not in range(1, 5):
+                raise ProblemError(f'courses.json: course {index} has no valid semester')
+            if any(courseId not in courseIds for courseId in course['cannotCollideWith']):
+                raise ProblemError(f'courses.json: course {index} cannot collide with an unknown course')
+
+            for session in course['sessions']:
+                if session['teacherId'] not in range(len(self.teacherData)):
+                    raise ProblemError(f'courses.json: a session of course {index} has an unknown teacher')
+                if session['length'] not in range(1, 10):
+                    raise ProblemError(f'courses.json: a session of course {index} has the length {session["length"]}')
+                if session.get('isFixed', False) and (session.get('day') not in range(5) or
+                                                      session.get('hour') not in range(9, 19 - session['length'])):
+                    raise ProblemError(f'courses.json: a fixed session of course {index} has no valid slot')
+
+        if not any(course.get('hasMultiTeachers', False) for course in self.courseData):
+            raise ProblemError('courses.json: no course has multiple teachers')
+        if len(self.fixedSlots) != 5:
+            raise ProblemError('fixedSlots.json needs 5 days')
+
+    def calculateSemesterPositions(self):
+        # Index of every session within its semester, for the semester genomes
+        positions = {}
+        sizes = [0] * 8
+        for sessionId in self.orderedSessionIds:
+            semesterIndex = self.sessionSemesters[sessionId]
+            positions[sessionId] = sizes[semesterIndex]
+            sizes[semesterIndex] += 1
+        return positions, sizes
+
+    def calculateCannotCollidePairs(self):
+        # Every pair of sessions that must not collide, once, with whether each
+        # side lists the course of the other one in cannotCollideWith
+        pairs = []
+        seen = set()
+        for first in self.sessionData:
+            cannotCollideWith = self.courseData[first['courseId']]['cannotCollideWith']
+            for second in self.sessionData:
+                firstListsSecond = second['courseId'] in cannotCollideWith
+                secondListsFirst = first['courseId'] in self.courseData[second['courseId']]['cannotCollideWith']
+                if (firstListsSecond or secondListsFirst) and (second['id'], first['id']) not in seen:
+                    seen.add((first['id'], second['id']))
+                    pairs.append(
+                        (first['id'], second['id'], firstListsSecond, secondListsFirst))
+
+        pairsOfSession = {session['id']: [] for session in self.sessionData}
+        for pairIndex, (firstId, secondId, _, _) in enumerate(pairs):
+            pairsOfSession[firstId].append(pairIndex)
+            if secondId != firstId:
+                pairsOfSession[secondId].append(pairIndex)
+
+        return pairs, pairsOfSession
+
+
+def getFileStamps(directory):
+    return {name: (os.stat(f'{directory}/{name}').st_mtime_ns, os.stat(f'{directory}/{name}').st_size)
+            for name in DATA_FILES}
+
+
+def getFileHashes(directory):
+    hashes = {}
+    for name in DATA_FILES:
+        with open(f'{directory}/{name}', 'rb') as file:
+            hashes[name] = hashlib.sha256(file.read()).hexdigest()
+    return hashes
+
+
+def readProblemCache(directory):
+    try:
+        with open(f'{directory}/{CACHE_FILE}', 'rb') as file:
+            version, stamps, hashes, problem = pickle.load(file)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError, ValueError, TypeError):
+        return None, None, None
+    if version != CACHE_VERSION:
+        return None, None, None
+    return stamps, hashes, problem
+
+
+def writeProblemCache(directory, stamps, hashes, problem):
+    # Written to a temporary file and renamed like saveCheckpoint, a read only
+    # data directory only costs the cache
+    temporaryName = f'{directory}/{CACHE_FILE}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        with open(temporaryName, 'wb') as file:
+            pickle.dump((CACHE_VERSION, stamps, hashes, problem),
+                        file, pickle.HIGHEST_PROTOCOL)
+        os.replace(temporaryName, f'{directory}/{CACHE_FILE}')
+    except OSError:
+        if os.path.exists(temporaryName):
+            os.remove(temporaryName)
+
+
+def loadProblem(directory='./data'):
+    # The cache is used while the modification times and sizes of the data
+    # files match. Otherwise the contents are hashed: files that were only
+    # touched keep the cache, changed ones rebuild it. A long running process
+    # gets the same instance again until the files change.
+    directory = os.path.normpath(directory)
+    stamps = getFileStamps(directory)
+    if directory in problems and problems[directory][0] == stamps:
+        return problems[directory][1]
+
+    cachedStamps, cachedHashes, problem = readProblemCache(directory)
+
+    if problem is None or cachedStamps != stamps:
+        hashes = getFileHashes(directory)
+        if problem is None or cachedHashes != hashes:
+            problem = ProblemInstance(directory)
+        writeProblemCache(directory, stamps, hashes, problem)
+
+    problems[directory] = (stamps, problem)
+    return problem
+
+
+problems = {}
@@ -0,0 +1,143 @@
+from classes import Schedule, createState
+from slots import *
+
+
+# Deterministic repair of the hard constraints a crossover breaks: swapping a
+# semester between two schedules puts its sessions next to the teachers'
+# sessions of the other semesters. The sessions are kept in order while they
+# fit the teacher/day and semester/day occupancy of the ones kept before
+# them, the others move to the nearest start of their semester that is free
+# for all of their teachers, or to the one that overlaps the fewest slots.
+# initialAvailableMasks already leaves out the fixed slots, the Friday break,
+# the department meeting and the language block. Fixed sessions are never
+# moved, and a child the repair would make worse is kept as it is.
+
+
+def getTeacherRows(context, session):
+    # The co-taught course occupies all of its teachers
+    rows = [context.teacherIndices[session.teacher.id]]
+    if session.course.id == context.multiTeacherCourseId:
+        rows.extend(context.teacherIndices[teacherId]
+                    for teacherId in context.multiTeachers)
+    return rows
+
+
+def isBreakViolation(day, usedMask):
+    return day in [0, 1, 3] and usedMask & BREAK_MASK == BREAK_MASK
+
+
+def isFree(context, session, teacherMasks, semesterMasks):
+    # The slot of the session breaks no hard constraint with the occupied ones
+    sessionMask = getSessionMask(session.hour, session.length)
+    semesterMask = semesterMasks[context.sessionSemesters[session.id]][session.day]
+    return not sessionMask & ~context.initialAvailableMasks[session.day] and not sessionMask & semesterMask and \
+        not isBreakViolation(session.day, sessionMask | semesterMask) and \
+        not any(sessionMask & teacherMasks[row][session.day] for row in context.teacherRows[session.id])
+
+
+def occupy(context, session, teacherMasks, semesterMasks):
+    sessionMask = getSessionMask(session.hour, session.length)
+    semesterMasks[context.sessionSemesters[session.id]][session.day] |= sessionMask
+    for row in context.teacherRows[session.id]:
+        teacherMasks[row][session.day] |= sessionMask
+
+
+def findNearestPlacement(context, session, teacherMasks, semesterMasks):
+    # The same day first, then the days next to it, the nearest hour first
+    semesterMasksOfDays = semesterMasks[context.sessionSemesters[session.id]]
+    for day in sorted(range(5), key=lambda day: abs(day - session.day)):
+        freeMask = context.initialAvailableMasks[day] & ~semesterMasksOfDays[day]
+        for row in context.teacherRows[session.id]:
+            freeMask &= ~teacherMasks[row][day]
+        hours = sorted(startHours[session.length][freeMask],
+                       key=lambda hour: abs(hour - session.hour))
+        for hour in hours:
+            if not isBreakViolation(day, getSessionMask(hour, session.length) | semesterMasksOfDays[day]):
+                return day, hour
+    return None
+
+
+def findLeastBadPlacement(context, session, teacherMasks, semesterMasks):
+    # The available start with the fewest slots shared with the occupied ones,
+    # the current one and then the nearest first among equals
+    initialAvailableMasks = context.initialAvailableMasks
+    semesterMasksOfDays = semesterMasks[context.sessionSemesters[session.id]]
+
+    def getPenalty(placement):
+        day, hour = placement
+        sessionMask = getSessionMask(hour, session.length)
+        overlap = slotCounts[sessionMask & semesterMasksOfDays[day]] + \
+            sum(slotCounts[sessionMask & teacherMasks[row][day]] for row in context.teacherRows[session.id])
+        unavailable = slotCounts[sessionMask & ~initialAvailableMasks[day]]
+        return (overlap + unavailable + isBreakViolation(day, sessionMask | semesterMasksOfDays[day]),
+                abs(day - session.day), abs(hour - session.hour))
+
+    placements = [(day, hour) for day in range(5)
+                  for hour in startHours[session.length][initialAvailableMasks[day]]]
+    return min(placements + [(session.day, session.hour)], key=getPenalty)
+
+
+def repairCollisions(context, state):
+    # Moves the sessions of the state in place, returns the moved sessions
+    # with the day and hour they had before
+    teacherMasks = [[0] * 5 for _ in context.teachers]
+    semesterMasks = [[0] * 5 for _ in range(8)]
+    toMove = []
+
+    for session in sorted(state, key=lambda session: not session.isFixed):
+        if session.isFixed or isFree(context, session, teacherMasks, semesterMasks):
+            occupy(context, session, teacherMasks, semesterMasks)
+        else:
+            toMove.append(session)
+
+    moved = []
+    for index, session in enumerate(toMove):
+        # The slots of the sessions still to move are kept free for them.
+        # Failing that, a start free of the placed sessions only, else the
+        # start that overlaps them the least.
+        pendingTeacherMasks = copyMasks(teacherMasks)
+        pendingSemesterMasks = copyMasks(semesterMasks)
+        for pending in toMove[index + 1:]:
+            occupy(context, pending, pendingTeacherMasks, pendingSemesterMasks)
+
+        day, hour = findNearestPlacement(context, session, pendingTeacherMasks, pendingSemesterMasks) or \
+            findNearestPlacement(context, session, teacherMasks, semesterMasks) or \
+            findLeastBadPlacement(context, session, teacherMasks, semesterMasks)
+        if (day, hour) != (session.day, session.hour):
+            moved.append((session, session.day, session.hour))
+            session.day, session.hour = day, hour
+        occupy(context, session, teacherMasks, semesterMasks)
+
+    return moved
+
+
+def repairChild(context, state):
+    # The child of a crossover as a Schedule, repaired unless the repair
+    # would leave it with more hard constraint violations. The unrepaired
+    # child is only evaluated when the repair moved sessions and left hard
+    # violations, by delta evaluation from the repaired one.
+    repairedState = createState(state)
+    moved = repairCollisions(context, repairedState)
+    repaired = Schedule(context, repairedState)
+    if not moved or not repaired.countHardViolations():
+        return repaired
+
+    child = undoRepair(repaired, moved)
+    return repaired if repaired.countHardViolations() <= child.countHardViolations() else child
+
+
+def undoRepair(repaired, moved):
+    # The child as it was before the repair. The moved sessions of the
+    # repaired schedule are put back to their repaired slots afterwards.
+    sessions = [repaired.sessionsById[session.id] for session, _, _ in moved]
+    for session, (_, day, hour) in zip(sessions, moved):
+        session.day, session.hour = day, hour
+    child = repaired.withMovedSessions(sessions)
+    for session in sessions:
+        session.day, session.hour = repaired.positions[session.id]
+    return child
+
+
+def copyMasks(masks):
+    return [list(masksOfDays) for masksOfDays in masks]
+
@@ -0,0 +1,119 @@
+from classes import Schedule, createState
+from utils import getSemesterIndex
+from slots import *
+
+
+# Constructive schedules for the initial population: the sessions are placed
+# in DSATUR order on a conflict graph of sessions that must not overlap.
+# A session is "saturated" by the placements its placed neighbours took away,
+# so the session with the fewest valid placements left is placed next.
+
+
+def getSemesterOfSession(session):
+    return getSemesterIndex(session.course.department, session.course.year)
+
+
+def isSharingTeacher(context, first, second):
+    if first.teacher.id == second.teacher.id:
+        return True
+    # The co-taught course collides with every session of its teachers
+    return (first.course.id == context.multiTeacherCourseId and second.teacher.id in context.multiTeachers) or \
+        (second.course.id == context.multiTeacherCourseId and first.teacher.id in context.multiTeachers)
+
+
+def createConflictGraph(context, sessions, cannotCollidePairs):
+    neighbours = {session.id: set() for session in sessions}
+    for first in sessions:
+        for second in sessions:
+            if first.id != second.id and (getSemesterOfSession(first) == getSemesterOfSession(second) or
+                                          isSharingTeacher(context, first, second)):
+                neighbours[first.id].add(second.id)
+
+    for firstId, secondId, _, _ in cannotCollidePairs:
+        if firstId != secondId:
+            neighbours[firstId].add(secondId)
+            neighbours[secondId].add(firstId)
+
+    return {sessionId: sorted(ids) for sessionId, ids in neighbours.items()}
+
+
+def generateSeededSchedule(context):
+    conflictGraph = context.conflictGraph
+    initialAvailableMasks = context.initialAvailableMasks
+    state = createState(context.orderedSessions)
+    blockedMasks = {session.id: [0] * 5 for session in state}
+    semesterMasks = [[0] * 5 for _ in range(8)]
+    courseDays = {session.course.id: set() for session in state}
+
+    def place(session, day, hour):
+        session.day = day
+        session.hour = hour
+        sessionMask = getSessionMask(hour, session.length)
+        semesterMasks[getSemesterOfSession(session)][day] |= sessionMask
+        for neighbourId in conflictGraph[session.id]:
+            blockedMasks[neighbourId][day] |= sessionMask
+        courseDays[session.course.id].add(day)
+
+    def getFreeMask(session, day, blockedMask):
+        mask = initialAvailableMasks[day] & ~blockedMask
+        # Only one of 12.00 and 13.00 may be used on Monday, Tuesday and Thursday
+        if day in [0, 1, 3] and semesterMasks[getSemesterOfSession(session)][day] & BREAK_MASK:
+            mask &= ~BREAK_MASK
+        return mask
+
+    def getPlacements(session):
+        return [(day, hour) for day in range(5)
+                for hour in startHours[session.length][getFreeMask(session, day, blockedMasks[session.id][day])]]
+
+    def countPlacements(session):
+        return sum(len(startHours[session.length][getFreeMask(session, day, blockedMasks[session.id][day])])
+                   for day in range(5))
+
+    unplaced = []
+    for session in state:
+        if session.isFixed:
+            place(session, session.day, session.hour)
+        else:
+            unplaced.append(session)
+
+    # Ties are broken by degree, then randomly
+    context.random.shuffle(unplaced)
+    while unplaced:
+        session = min(unplaced, key=lambda session: (
+            countPlacements(session), -len(conflictGraph[session.id])))
+        unplaced.remove(session)
+
+        placements = getPlacements(session)
+        if not placements:
+            # Avoid at least the sessions of the same semester
+            placements = [(day, hour) for day in range(5)
+                          for hour in startHours[session.length][getFreeMask(session, day, semesterMasks[getSemesterOfSession(session)][day])]]
+        if not placements:
+            placements = [(day, hour) for day in range(5)
+                          for hour in range(FIRST_HOUR, FIRST_HOUR + SLOT_COUNT - session.length + 1)]
+
+        day, hour = context.random.choice(selectPreferredPlacements(
+            context, session, placements, semesterMasks[getSemesterOfSession(session)], courseDays[session.course.id]))
+        place(session, day, hour)
+
+    return Schedule(context, state)
+
+
+def selectPreferredPlacements(context, session, placements, semesterMasksOfDays, daysOfCourse):
+    # Placements that leave the fewest single free slots of the semester
+    # first, then the soft constraints: teacher availability, one session of
+    # a course per day
+    def getPenalty(placement):
+        day, hour = placement
+        sessionMask = getSessionMask(hour, session.length)
+        usedMask = semesterMasksOfDays[day] | sessionMask
+        freeMask = context.initialAvailableMasks[day] & ~usedMask
+        if day in [0, 1, 3] and usedMask & BREAK_MASK:
+            freeMask &= ~BREAK_MASK
+        unavailableMask = context.unavailableMasks[context.teacherIndices[session.teacher.id]][day]
+        return (singleSlotCounts[freeMask], slotCounts[sessionMask & unavailableMask], day in daysOfCourse)
+
+    penalties = [getPenalty(placement) for placement in placements]
+    lowestPenalty = min(penalties)
+    return [placement for placement, penalty in zip(placements, penalties) if penalty == lowestPenalty]
+
@@ -0,0 +1,426 @@
+from problem import loadProblem, getFileStamps, ProblemError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import threading
+import time
+
+
+# Local solver daemon: jobs are queued and run by a fixed number of warm
+# worker processes. A worker stays bound to one problem directory and its
+# weights, so the imports and the SolverContext of the problem are built once
+# and every following job of the same problem only replaces its constants. Jobs always run the genetic
+# engine without islands, ENGINE and ISLANDS are not used. A job with
+# WARM_START_SCHEDULE starts from that schedule of output/ (see warmstart.py).
+#
+#   POST   /jobs                 {"problem": "./data", "config": {}, "weights": {}, "seed": 1}
+#   GET    /jobs                 all jobs
+#   GET    /jobs/<id>            status, last progress and result summary
+#   GET    /jobs/<id>/events     progress as JSON lines until the job ends
+#   GET    /jobs/<id>/schedule   best schedule as JSON
+#   GET    /jobs/<id>/excel      best schedule as an Excel file
+#   DELETE /jobs/<id>            cancel, a running job keeps its best schedule
+
+
+class Job:
+    def __init__(self, id, directory, config, weights, seed):
+        self.id = id
+        self.directory = directory
+        self.config = config
+        self.weights = weights
+        self.seed = seed
+
+        self.status = 'queued'
+        self.progress = []
+        self.schedule = None
+        self.excelPath = None
+        self.error = None
+        self.isCancelRequested = False
+        self.createdAt = time.time()
+        self.condition = threading.Condition()
+
+    def update(self, **changes):
+        with self.condition:
+            for name, value in changes.items():
+                setattr(self, name, value)
+            self.condition.notify_all()
+
+    def addProgress(self, progress):
+        with self.condition:
+            self.progress.append(progress)
+            self.condition.notify_all()
+
+    def isFinished(self):
+        return self.status in ['done', 'cancelled', 'failed']
+
+    def getSummary(self):
+        with self.condition:
+            return {
+                'id': self.id,
+                'status': self.status,
+                'problem': self.directory,
+                'config': self.config,
+                'weights': self.weights,
+                'seed': self.seed,
+                'progress': self.progress[-1] if self.progress else None,
+                'fitness': self.schedule['fitness'] if self.schedule else None,
+                'isFeasible': self.schedule['isFeasible'] if self.schedule else None,
+                'hasExcel': self.excelPath is not None,
+                'error': self.error,
+            }
+
+
+class WarmWorker:
+    # One worker process bound to a problem instance, jobs and cancel
+    # requests go in through a pipe, progress and results come out of it
+    def __init__(self, instance, weights):
+        processContext = multiprocessing.get_context('spawn')
+        self.connection, workerConnection = processContext.Pipe()
+        self.process = processContext.Process(
+            target=runWorker, args=(instance, weights, workerConnection))
+        self.process.start()
+
+    def run(self, job):
+        self.connection.send(('job', job.id, job.config, job.seed))
+        isCancelSent = False
+
+        while True:
+            if job.isCancelRequested and not isCancelSent:
+                self.connection.send(('cancel',))
+                isCancelSent = True
+
+            if not self.connection.poll(0.2):
+                if not self.process.is_alive():
+                    job.update(status='failed',
+                               error='The worker process stopped')
+                    return
+                continue
+
+            message = self.connection.recv()
+            if message[0] == 'progress':
+                job.addProgress(message[1])
+            elif message[0] == 'result':
+                schedule, excelPath, error, isCancelled = message[1:]
+                job.update(schedule=schedule, excelPath=excelPath, error=error,
+                           status='cancelled' if isCancelled else 'done')
+                return
+            elif message[0] == 'error':
+                job.update(status='failed', error=message[1])
+                return
+
+    def isAlive(self):
+        return self.process.is_alive()
+
+    def stop(self):
+        if self.process.is_alive():
+            try:
+                self.connection.send(('stop',))
+            except OSError:
+                pass
+            self.process.join(5)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+
+
+def runWorker(instance, weights, connection):
+    # Runs in the worker process: the context of the instance is built once,
+    # then the process waits for jobs
+    from context import SolverContext
+    from evolve import evolutionSteps
+    from export import scheduleToDict, saveToExcel
+    from warmstart import prepareWarmStart, generateWarmStartSeeds, restorePreviousPositions
+
+    baseContext = SolverContext(instance, weights=weights)
+    baseConstants = {name for name in vars(baseContext) if name.isupper()}
+
+    while True:
+        message = connection.recv()
+        if message[0] == 'stop':
+            return
+        if message[0] != 'job':
+            # A cancel request that came after the job had ended
+            continue
+
+        jobId, config, seed = message[1:]
+        unknown = [name for name in config if name not in baseConstants]
+        if unknown:
+            connection.send(
+                ('error', f'Unknown constants: {", ".join(unknown)}'))
+            continue
+
+        # Jobs share the output directory, the service keeps the results itself
+        context = baseContext.withConstants(
+            dict(config, CHECKPOINT_NAME=''), seed)
+
+        seeds = None
+        previousPositions = {}
+        try:
+            if context.WARM_START_SCHEDULE:
+                repaired, previousPositions, _ = prepareWarmStart(context)
+                seeds = generateWarmStartSeeds(repaired)
+        except Exception as exception:
+            connection.send(('error', repr(exception)))
+            continue
+
+        isCancelled = False
+        isStopped = False
+        steps = evolutionSteps(context, seeds=seeds)
+        try:
+            for snapshot in steps:
+                connection.send(('progress', {
+                    'generation': snapshot.generation + 1,
+                    'bestFitness': snapshot.bestFitness,
+                    'isFeasible': snapshot.isFeasible,
+                    'stagnation': snapshot.stagnation,
+                    'mutationRate': snapshot.mutationRate,
+                    'elapsed': snapshot.elapsed,
+                    'generationTime': snapshot.generationTime,
+                }))
+                # A stop during the job cancels it, the result is still sent
+                # before the process exits
+                if connection.poll():
+                    request = connection.recv()[0]
+                    if request in ['cancel', 'stop']:
+                        isCancelled = True
+                        isStopped = request == 'stop'
+                        break
+        except Exception as exception:
+            connection.send(('error', repr(exception)))
+            continue
+        finally:
+            steps.close()
+
+        best = restorePreviousPositions(
+            snapshot.bestSchedule, previousPositions)
+        excelPath = f'./excel/job {jobId}.xlsx'
+        error = None
+        try:
+            saveToExcel(best, filename=f'job {jobId}')
+        except Exception as exception:
+            excelPath = None
+            error = f'Excel export failed: {exception!r}'
+        connection.send(
+            ('result', scheduleToDict(best), excelPath, error, isCancelled))
+        if isStopped:
+            return
+
+
+class SolverService:
+    def __init__(self, workers=2, queueSize=100):
+        self.jobs = {}
+        self.queue = queue.Queue(queueSize)
+        self.lock = threading.Lock()
+        self.nextId = 1
+        self.workers = [None] * workers
+        self.dispatchers = [threading.Thread(target=self.dispatch, args=(index,), daemon=True)
+                            for index in range(workers)]
+        for dispatcher in self.dispatchers:
+            dispatcher.start()
+
+    def submit(self, directory, config, weights, seed):
+        # Raises queue.Full when the queue is full, ProblemError and OSError
+        # for a directory that cannot be loaded
+        loadProblem(directory)
+        with self.lock:
+            job = Job(str(self.nextId), directory, config, weights, seed)
+            self.queue.put_nowait(job)
+            self.jobs[job.id] = job
+            self.nextId += 1
+        return job
+
+    def cancel(self, job):
+        with job.condition:
+            job.isCancelRequested = True
+            if job.status == 'queued':
+                job.status = 'cancelled'
+            job.condition.notify_all()
+
+    def dispatch(self, index):
+        # Every dispatcher thread drives one warm worker and restarts it for
+        # jobs of another problem, other weights or changed data files
+        key = None
+        while True:
+            job = self.queue.get()
+            if job is None:
+                return
+            with job.condition:
+                if job.status != 'queued':
+                    continue
+                job.status = 'running'
+                job.condition.notify_all()
+
+            try:
+                instance = loadProblem(job.directory)
+                jobKey = (os.path.normpath(job.directory), tuple(getFileStamps(job.directory).items()),
+                          json.dumps(job.weights, sort_keys=True))
+            except (OSError, ProblemError, ValueError) as exception:
+                job.update(status='failed', error=repr(exception))
+                continue
+
+            worker = self.workers[index]
+            if worker is None or key != jobKey or not worker.isAlive():
+                if worker:
+                    worker.stop()
+                worker = self.workers[index] = WarmWorker(
+                    instance, job.weights)
+                key = jobKey
+
+            worker.run(job)
+
+    def stop(self):
+        for _ in self.dispatchers:
+            self.queue.put(None)
+        for job in list(self.jobs.values()):
+            self.cancel(job)
+        for dispatcher in self.dispatchers:
+            dispatcher.join(10)
+        for worker in self.workers:
+            if worker:
+                worker.stop()
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    service = None
+
+    def sendJson(self, status, content):
+        body = json.dumps(content).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def getJob(self, jobId):
+        job = self.service.jobs.get(jobId)
+        if not job:
+            self.sendJson(404, {'error': f'No job {jobId}'})
+        return job
+
+    def getPathParts(self):
+        return [part for part in self.path.split('?')[0].split('/') if part]
+
+    def do_POST(self):
+        parts = self.getPathParts()
+        if parts != ['jobs']:
+            return self.sendJson(404, {'error': 'Not found'})
+
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length) or b'{}')
+            directory = request.get('problem', './data')
+            config = dict(request.get('config', {}))
+            weights = dict(request.get('weights', {}))
+            seed = request.get('seed')
+        except (ValueError, TypeError, AttributeError) as exception:
+            return self.sendJson(400, {'error': f'Invalid request: {exception}'})
+
+        try:
+            job = self.service.submit(directory, config, weights, seed)
+        except queue.Full:
+            return self.sendJson(503, {'error': 'The job queue is full'})
+        except (OSError, ProblemError) as exception:
+            return self.sendJson(400, {'error': f'Invalid problem: {exception}'})
+        self.sendJson(201, {'id': job.id})
+
+    def do_DELETE(self):
+        parts = self.getPathParts()
+        if len(parts) != 2 or parts[0] != 'jobs':
+            return self.sendJson(404, {'error': 'Not found'})
+        job = self.getJob(parts[1])
+        if job:
+            self.service.cancel(job)
+            self.sendJson(202, job.getSummary())
+
+    def do_GET(self):
+        parts = self.getPathParts()
+        if parts == ['jobs']:
+            return self.sendJson(200, [job.getSummary() for job in self.service.jobs.values()])
+        if len(parts) not in [2, 3] or parts[0] != 'jobs':
+            return self.sendJson(404, {'error': 'Not found'})
+
+        job = self.getJob(parts[1])
+        if not job:
+            return
+        if len(parts) == 2:
+            return self.sendJson(200, job.getSummary())
+        if parts[2] == 'events':
+            return self.streamEvents(job)
+        if parts[2] == 'schedule':
+            if not job.schedule:
+                return self.sendJson(409, {'error': f'Job {job.id} has no schedule yet', 'status': job.status})
+            return self.sendJson(200, job.schedule)
+        if parts[2] == 'excel':
+            return self.sendExcel(job)
+        self.sendJson(404, {'error': 'Not found'})
+
+    def streamEvents(self, job):
+        # One JSON line per generation, the last line is the job summary
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.end_headers()
+
+        sent = 0
+        while True:
+            with job.condition:
+                while sent == len(job.progress) and not job.isFinished():
+                    job.condition.wait()
+                progress = job.progress[sent:]
+                isFinished = job.isFinished() and sent + \
+                    len(progress) == len(job.progress)
+            try:
+                for entry in progress:
+                    self.wfile.write(json.dumps(entry).encode('utf-8') + b'\n')
+                sent += len(progress)
+                if isFinished:
+                    self.wfile.write(json.dumps(
+                        job.getSummary()).encode('utf-8') + b'\n')
+                    return
+                self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                return
+
+    def sendExcel(self, job):
+        if not job.excelPath:
+            return self.sendJson(409, {'error': job.error or f'Job {job.id} has no Excel file yet', 'status': job.status})
+        with open(job.excelPath, 'rb') as file:
+            body = file.read()
+        self.send_response(200)
+        self.send_header(
+            'Content-Type', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        self.send_header('Content-Disposition',
+                         f'attachment; filename="job {job.id}.xlsx"')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(host='127.0.0.1', port=8765, workers=2, queueSize=100):
+    service = SolverService(workers, queueSize)
+    ServiceHandler.service = service
+    server = ThreadingHTTPServer((host, port), ServiceHandler)
+    server.daemon_threads = True
+    print(f'Solver service on http://{host}:{server.server_port} ({workers} workers)')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local timetable solver service')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--queue-size', type=int, default=100)
+    arguments = parser.parse_args()
+    serve(arguments.host, arguments.port, arguments.workers, arguments.queue_size)
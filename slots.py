@@ -0,0 +1,94 @@
+# A day has 9 hourly slots (9.00 - 18.00), so the slots of a day fit in a
+# 9-bit mask where bit 0 is 9.00 and bit 8 is 17.00.
+FIRST_HOUR = 9
+SLOT_COUNT = 9
+MASK_COUNT = 1 << SLOT_COUNT
+
+
+def getSlotBit(hour):
+    return 1 << (hour - FIRST_HOUR)
+
+
+def getSlotMask(hours):
+    mask = 0
+    for hour in hours:
+        mask |= getSlotBit(hour)
+    return mask
+
+
+def getSessionMask(hour, length):
+    return ((1 << length) - 1) << (hour - FIRST_HOUR)
+
+
+def getHoursOfMask(mask):
+    return [FIRST_HOUR + slot for slot in range(SLOT_COUNT) if mask >> slot & 1]
+
+
+def getRunsOfMask(mask):
+    runs = []
+    run = 0
+    for slot in range(SLOT_COUNT + 1):
+        if slot < SLOT_COUNT and mask >> slot & 1:
+            run |= 1 << slot
+        elif run:
+            runs.append(run)
+            run = 0
+    return runs
+
+
+def getSpanMask(mask):
+    if not mask:
+        return 0
+    hours = getHoursOfMask(mask)
+    return getSessionMask(hours[0], hours[-1] - hours[0] + 1)
+
+
+def getEmptySlotsOfRange(dayRange):
+    # One of 12.00 and 13.00 is kept free as the break, so it is not an empty slot
+    hours = getHoursOfMask(dayRange)
+    if 12 in hours and 13 in hours:
+        return [hour for hour in hours if hour != 13]
+    if 12 in hours:
+        return [hour for hour in hours if hour != 12]
+    if 13 in hours:
+        return [hour for hour in hours if hour != 13]
+    return hours
+
+
+def getStartHoursOfMask(mask, length):
+    # Start hours of a session that fits into the free slots of the mask
+    # without taking both 12.00 and 13.00
+    startHours = []
+    for hour in range(FIRST_HOUR, FIRST_HOUR + SLOT_COUNT - length + 1):
+        sessionMask = getSessionMask(hour, length)
+        if not sessionMask & ~mask and sessionMask & BREAK_MASK != BREAK_MASK:
+            startHours.append(hour)
+    return startHours
+
+
+def getBorderingSlotsOfMask(slotsOfDay, sessionMask):
+    # Mask version of utils.getBorderingSlots
+    for run in slotRuns[slotsOfDay | sessionMask]:
+        if run & sessionMask:
+            return list(slotHours[run & ~sessionMask])
+
+
+BREAK_MASK = getSlotMask([12, 13])
+
+slotHours = [tuple(getHoursOfMask(mask)) for mask in range(MASK_COUNT)]
+slotCounts = [len(hours) for hours in slotHours]
+slotRuns = [getRunsOfMask(mask) for mask in range(MASK_COUNT)]
+spanMasks = [getSpanMask(mask) for mask in range(MASK_COUNT)]
+slotSpans = [slotCounts[mask] for mask in spanMasks]
+emptySlotHours = [tuple(getEmptySlotsOfRange(mask))
+                  for mask in range(MASK_COUNT)]
+emptySlotCounts = [len(hours) for hours in emptySlotHours]
+# Runs of more than one slot as hour lists, like utils.getConsecutiveSlots
+consecutiveSlots = [[list(slotHours[run]) for run in slotRuns[mask] if slotCounts[run] > 1]
+                    for mask in range(MASK_COUNT)]
+# Free slots that are too short for any session
+singleSlotCounts = [sum(slotCounts[run] == 1 for run in slotRuns[mask])
+                    for mask in range(MASK_COUNT)]
+# Valid start hours by session length and free slots of a day
+startHours = {length: [tuple(getStartHoursOfMask(mask, length)) for mask in range(MASK_COUNT)]
+              for length in range(1, SLOT_COUNT + 1)}
@@ -0,0 +1,172 @@
+from classes import Schedule, createState
+from seeding import getSemesterOfSession
+from slots import *
+import random
+import time
+
+
+# Backtracking search for a schedule without hard constraint violations.
+# The domain of a session is one mask of possible start slots per day, bit 0
+# being a start at 9.00. Fixed slots, the Friday break, the department
+# meeting and the language block are already left out of
+# initialAvailableMasks, so only collisions and the 12.00/13.00 break rule
+# have to be propagated.
+
+
+class SearchLimitReached(Exception):
+    pass
+
+
+class FeasibilitySolver:
+    def __init__(self, context, nodeLimit, timeLimit, seed):
+        self.context = context
+        self.nodeLimit = nodeLimit
+        self.timeLimit = timeLimit
+        self.random = random.Random(seed)
+
+        self.state = createState(context.orderedSessions)
+        self.semesters = {session.id: getSemesterOfSession(
+            session) for session in self.state}
+        self.lengths = {session.id: session.length for session in self.state}
+        self.domains = {session.id: [startMasks[session.length][context.initialAvailableMasks[day]] for day in range(5)]
+                        for session in self.state}
+        self.semesterMasks = [[0] * 5 for _ in range(8)]
+        self.trail = []
+        self.nodes = 0
+        self.isExhausted = False
+
+        self.unassigned = [
+            session for session in self.state if not session.isFixed]
+        # Ties of the variable order are broken randomly
+        self.random.shuffle(self.unassigned)
+        self.unassignedIds = {session.id for session in self.unassigned}
+
+    def solve(self):
+        self.time0 = time.perf_counter()
+
+        for session in self.state:
+            if session.isFixed and not self.assign(session, session.day, session.hour):
+                self.isExhausted = True
+                return None
+
+        try:
+            if not self.search():
+                self.isExhausted = True
+                return None
+        except SearchLimitReached:
+            return None
+
+        return Schedule(self.context, self.state)
+
+    def search(self):
+        if not self.unassigned:
+            return True
+
+        session = min(self.unassigned, key=lambda session: (
+            countDomain(self.domains[session.id]), -len(self.context.feasibilityGraph[session.id])))
+        self.unassigned.remove(session)
+        self.unassignedIds.remove(session.id)
+
+        for day, hour in self.orderPlacements(session):
+            self.nodes += 1
+            if self.nodes > self.nodeLimit or time.perf_counter() - self.time0 > self.timeLimit:
+                raise SearchLimitReached()
+
+            mark = len(self.trail)
+            semesterMask = self.semesterMasks[self.semesters[session.id]][day]
+            if self.assign(session, day, hour) and self.search():
+                return True
+            self.undo(mark, session, day, semesterMask)
+
+        self.unassigned.append(session)
+        self.unassignedIds.add(session.id)
+        return False
+
+    def orderPlacements(self, session):
+        # Placements that leave the fewest single free slots in the semester first
+        semesterMasks = self.semesterMasks[self.semesters[session.id]]
+        placements = []
+        for day, domain in enumerate(self.domains[session.id]):
+            for hour in slotHours[domain]:
+                usedMask = semesterMasks[day] | getSessionMask(
+                    hour, session.length)
+                freeMask = self.context.initialAvailableMasks[day] & ~usedMask
+                if day in [0, 1, 3] and usedMask & BREAK_MASK:
+                    freeMask &= ~BREAK_MASK
+                placements.append(
+                    (singleSlotCounts[freeMask], self.random.random(), day, hour))
+        placements.sort()
+        return [(day, hour) for _, _, day, hour in placements]
+
+    def assign(self, session, day, hour):
+        # Sets the session and removes the starts it rules out from the
+        # domains of its unassigned neighbours, False on a wiped out domain
+        session.day = day
+        session.hour = hour
+        sessionMask = getSessionMask(hour, session.length)
+        semester = self.semesters[session.id]
+        self.semesterMasks[semester][day] |= sessionMask
+
+        semesterMask = self.semesterMasks[semester][day]
+        breakMask = 0
+        if day in [0, 1, 3] and semesterMask & BREAK_MASK:
+            breakMask = BREAK_MASK & ~semesterMask
+
+        for neighbourId in self.context.feasibilityGraph[session.id]:
+            if neighbourId not in self.unassignedIds:
+                continue
+            blockedMask = sessionMask
+            if self.semesters[neighbourId] == semester:
+                blockedMask |= breakMask
+            domain = self.domains[neighbourId]
+            removed = domain[day] & overlappingStarts[self.lengths[neighbourId]][blockedMask]
+            if removed:
+                self.trail.append((neighbourId, day, domain[day]))
+                domain[day] &= ~removed
+                if not any(domain):
+                    return False
+        return True
+
+    def undo(self, mark, session, day, semesterMask):
+        while len(self.trail) > mark:
+            neighbourId, neighbourDay, domain = self.trail.pop()
+            self.domains[neighbourId][neighbourDay] = domain
+        self.semesterMasks[self.semesters[session.id]][day] = semesterMask
+
+
+def solveFeasibility(context, nodeLimit=100000, timeLimit=10, seed=None, restartLimit=1000):
+    # Returns a Schedule without hard constraint violations, None if there is
+    # none or the search ran out of nodes or time. The search restarts with
+    # another random tie-break order every restartLimit nodes.
+    rng = random.Random(seed)
+    time0 = time.perf_counter()
+    nodes = 0
+
+    while nodes < nodeLimit:
+        elapsed = time.perf_counter() - time0
+        if elapsed > timeLimit:
+            break
+        solver = FeasibilitySolver(context, min(restartLimit, nodeLimit - nodes),
+                                   timeLimit - elapsed, rng.getrandbits(32))
+        schedule = solver.solve()
+        nodes += solver.nodes
+        if schedule or solver.isExhausted:
+            return schedule
+
+    return None
+
+
+def countDomain(domain):
+    return sum(slotCounts[startMask] for startMask in domain)
+
+
+def getOverlappingStarts(length, mask):
+    # Starts of a session of the given length that would overlap the mask
+    return getSlotMask([hour for hour in range(FIRST_HOUR, FIRST_HOUR + SLOT_COUNT)
+                        if getSessionMask(hour, length) & mask])
+
+
+startMasks = {length: [getSlotMask(startHoursOfMask) for startHoursOfMask in startHours[length]]
+              for length in startHours}
+overlappingStarts = {length: [getOverlappingStarts(length, mask) for mask in range(MASK_COUNT)]
+                     for length in startHours}
@@ -0,0 +1,153 @@
+from export import exportSchedule
+import evolve
+import math
+import time
+
+
+# Single trajectory search: one schedule is changed by the mutation operators
+# of evolve.py and the change is kept or dropped by simulated annealing or by
+# a tabu search. Both use the fitness of Schedule like the GA does.
+
+
+def createNeighbour(schedule):
+    # The operators move the sessions of the given schedule and return a new
+    # one, so the sessions are put back to keep the current schedule intact
+    neighbour = evolve.performMutation(
+        schedule, schedule.context.TRAJECTORY_MUTATION_TYPE)
+    for session in schedule.state:
+        session.day, session.hour = schedule.positions[session.id]
+    return neighbour
+
+
+def getMovedPositions(schedule, neighbour):
+    return [(sessionId, position) for sessionId, position in enumerate(neighbour.positions)
+            if position is not None and position != schedule.positions[sessionId]]
+
+
+def calculateTemperature(context, step, steps):
+    initial = context.ANNEALING_INITIAL_TEMPERATURE
+    final = context.ANNEALING_FINAL_TEMPERATURE
+    progress = step / max(steps - 1, 1)
+
+    if context.ANNEALING_COOLING == 'linear':
+        return initial - (initial - final) * progress
+    if context.ANNEALING_COOLING == 'lundy':
+        # T(k) = T0 / (1 + beta * T0 * k) with beta chosen to end at the final temperature
+        beta = (initial - final) / (initial * final * max(steps - 1, 1))
+        return initial / (1 + beta * initial * step)
+    return initial * (final / initial) ** progress
+
+
+def isAccepted(context, delta, temperature):
+    return delta >= 0 or context.random.random() < math.exp(delta / temperature)
+
+
+def anneal(schedule):
+    context = schedule.context
+    current = schedule
+    best = schedule
+    temperature = context.ANNEALING_INITIAL_TEMPERATURE
+
+    for step in range(context.TRAJECTORY_STEPS):
+        temperature = calculateTemperature(
+            context, step, context.TRAJECTORY_STEPS)
+        neighbour = createNeighbour(current)
+        if isAccepted(context, neighbour.fitness - current.fitness, temperature):
+            current = neighbour
+
+        if current.fitness > best.fitness:
+            best = current
+        yield step, current, best, temperature
+
+
+def searchTabu(schedule):
+    # Positions left by a move may not be taken again for TABU_TENURE steps,
+    # unless that finds a new best schedule
+    context = schedule.context
+    current = schedule
+    best = schedule
+    tabu = {}
+
+    for step in range(context.TRAJECTORY_STEPS):
+        candidates = []
+        for _ in range(context.TABU_NEIGHBOURS):
+            neighbour = createNeighbour(current)
+            moved = getMovedPositions(current, neighbour)
+            if not moved:
+                continue
+            isTabu = any(tabu.get(move, -1) >= step for move in moved)
+            if not isTabu or neighbour.fitness > best.fitness:
+                candidates.append((neighbour, moved))
+
+        if candidates:
+            neighbour, moved = max(
+                candidates, key=lambda candidate: candidate[0].fitness)
+            for sessionId, _ in moved:
+                tabu[(sessionId, current.positions[sessionId])
+                     ] = step + context.TABU_TENURE
+            current = neighbour
+
+        if current.fitness > best.fitness:
+            best = current
+        yield step, current, best, len(candidates)
+
+
+def trajectorySearch(context, method=None, start=None, report=True, history=None):
+    method = method or context.ENGINE
+    if method != 'tabu' and min(context.ANNEALING_INITIAL_TEMPERATURE, context.ANNEALING_FINAL_TEMPERATURE) <= 0:
+        # The cooling schedules divide by both temperatures
+        raise ValueError('ANNEALING_INITIAL_TEMPERATURE and ANNEALING_FINAL_TEMPERATURE must be greater than 0')
+    context.resetCaches()
+
+    time0 = time.time()
+    schedule = start or evolve.generatePopulation(context, 1)[0]
+    time1 = time.time()
+
+    search = searchTabu if method == 'tabu' else anneal
+    bestScore = schedule.fitness
+    stagnation = 0
+    stepTime = 0
+    timeOfStep = time.time()
+
+    for step, current, best, parameter in search(schedule):
+        stepTime = max(stepTime, time.time() - timeOfStep)
+        timeOfStep = time.time()
+
+        if best.fitness > bestScore:
+            bestScore = best.fitness
+            stagnation = 0
+        else:
+            stagnation += 1
+
+        if history is not None:
+            history.append((time.time() - time1, step, best.fitness))
+
+        if report and (step + 1) % context.TRAJECTORY_REPORT_INTERVAL == 0:
+            print(f'\nSTEP {step + 1}')
+            print(f'Current: {round(current.fitness, 2)}')
+            print(f'Best So Far: {round(best.fitness, 2)}', end=' ')
+            print('FEASIBLE') if best.isFeasible else print('NON-FEASIBLE')
+            if method == 'tabu':
+                print(f'stagnation = {stagnation}, allowed_neighbours = {parameter}')
+            else:
+                print(f'stagnation = {stagnation}, temperature = {round(parameter, 4)}')
+
+        if stagnation > context.TRAJECTORY_STAGNATION_LIMIT or evolve.isOutOfTime(context, time0, stepTime):
+            break
+
+    time2 = time.time()
+
+    if not report:
+        return best
+
+    exportSchedule(
+        best, name=f'{round(best.fitness, 2)}, {method}, {context.TRAJECTORY_STEPS}')
+    best.printInfo()
+
+    print(
+        f'\nInitial schedule:\t\t{time1-time0}\nSearch total time:\t\t{time2-time1}')
+    print(f'Time per step:\t\t\t{(time2-time1)/(step + 1)}')
+    for cache in context.caches:
+        cache.printStats()
+
+    return best
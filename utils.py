@@ -22,10 +22,7 @@ def getBorderingSlots(slotsOfDay, slotsOfSession):
             return [slot for slot in group if slot not in slotsOfSession]
 
 
-def calculateAvailableSlots():
-    fixedSlots = importFixed()
-    languageSlots = getLanguageSlots()
-
+def calculateAvailableSlots(fixedSlots, languageSlots):
     allSlots = [list(range(9, 18))] * 5
     availableSlots = []
     unavailableSlots = []
@@ -88,25 +85,24 @@ def getStateFromSemesters(schedule):
     return sessions
 
 
-def importData():
-    with open('./data/teachers.json', encoding='utf-8') as json_file:
+def importData(directory='./data'):
+    with open(f'{directory}/teachers.json', encoding='utf-8') as json_file:
         teachers_json = json.load(json_file)
 
-    with open('./data/courses.json', encoding='utf-8') as json_file:
+    with open(f'{directory}/courses.json', encoding='utf-8') as json_file:
         courses_json = json.load(json_file)
 
     return teachers_json, courses_json
 
 
-def importFixed():
-    with open('./data/fixedSlots.json', encoding='utf-8') as json_file:
+def importFixed(directory='./data'):
+    with open(f'{directory}/fixedSlots.json', encoding='utf-8') as json_file:
         fixedSlots = json.load(json_file)
 
     return fixedSlots
 
 
-def getLanguageSlots():
-    languageSessions = importLanguageSessions()
+def getLanguageSlots(languageSessions):
     languageSlots = [[]] * 5
 
     for i in range(5):
@@ -116,32 +112,28 @@ def getLanguageSlots():
     return languageSlots
 
 
-def getMultiTeacherCourse():
-    courses_json = importData()[1]
+def getMultiTeacherCourse(courses_json):
     return next(
         (course['id'], course['teachers']) for course in courses_json if course.get("hasMultiTeachers", False) == True)
 
 
-def importLanguageSessions():
-    with open('./data/languageSlots.json', encoding='utf-8') as json_file:
+def importLanguageSessions(directory='./data'):
+    with open(f'{directory}/languageSlots.json', encoding='utf-8') as json_file:
         languageSessions = json.load(json_file)
 
     return languageSessions
 
 
-def importEvolutionConstants():
-    with open('./data/evolutionConstants.json', encoding='utf-8') as json_file:
+def importEvolutionConstants(directory='./data'):
+    with open(f'{directory}/evolutionConstants.json', encoding='utf-8') as json_file:
         evolutionConstants = json.load(json_file)
 
     return evolutionConstants
 
 
-def importConstraintWeights():
-    with open('./data/constraintWeights.json', encoding='utf-8') as json_file:
+def importConstraintWeights(directory='./data'):
+    with open(f'{directory}/constraintWeights.json', encoding='utf-8') as json_file:
         constraintWeights = json.load(json_file)
 
     return constraintWeights
 
-
-languageSlots = importLanguageSessions()
-initialAvailableSlots = calculateAvailableSlots()
@@ -0,0 +1,215 @@
+from classes import Schedule, createState
+from export import importSchedule, exportSchedule
+from seeding import getSemesterOfSession
+from trajectory import createNeighbour, trajectorySearch
+from slots import *
+import evolve
+import time
+
+
+# Re-planning after a small change of the data: the sessions of a previous
+# schedule are mapped onto the current instance, only the sessions the change
+# touched are placed again and the GA starts from small perturbations of the
+# result instead of random schedules. Sessions are matched by their course
+# code, teacher and suffix, since the ids shift when sessions are added.
+
+
+def getSessionKey(session):
+    return (session.course.code, session.teacher.firstName, session.teacher.lastName, session.isLab, session.suffix)
+
+
+def getCourseKey(session):
+    return (session.course.code, session.isLab, session.suffix)
+
+
+def mapPreviousSchedule(context, previous):
+    # Returns the current sessions at the slots of the previous schedule, the
+    # previous slot of every matched session and the ids of the sessions
+    # without a match or with another teacher or length. Sessions that only
+    # got another teacher are matched by course and suffix in a second pass.
+    state = createState(context.orderedSessions)
+    matches = {}
+    changedIds = set()
+
+    for getKey in [getSessionKey, getCourseKey]:
+        matchedIds = {match.id for match in matches.values()}
+        candidates = {}
+        for session in sorted(previous.state, key=lambda session: session.id):
+            if session.id not in matchedIds:
+                candidates.setdefault(getKey(session), []).append(session)
+
+        for session in state:
+            if session.id in matches or not candidates.get(getKey(session)):
+                continue
+            match = candidates[getKey(session)].pop(0)
+            matches[session.id] = match
+            if getKey is getCourseKey or match.length != session.length:
+                changedIds.add(session.id)
+            # Fixed sessions only have to keep their day
+            if not session.isFixed or match.day == session.day:
+                session.day, session.hour = match.day, match.hour
+
+    changedIds.update(
+        session.id for session in state if session.id not in matches)
+    previousPositions = {sessionId: (match.day, match.hour)
+                         for sessionId, match in matches.items()}
+    return state, previousPositions, changedIds
+
+
+def isValidPlacement(context, session, day, hour):
+    if day is None or hour is None or hour + session.length > FIRST_HOUR + SLOT_COUNT:
+        return False
+    sessionMask = getSessionMask(hour, session.length)
+    return not sessionMask & (~context.initialAvailableMasks[day] |
+                              context.unavailableMasks[context.teacherIndices[session.teacher.id]][day])
+
+
+def findAffectedSessions(context, state, changedIds):
+    # The changed sessions and the ones whose slot the change made unavailable:
+    # a teacher's unavailable hours, the fixed slots or the language block
+    return [session for session in state
+            if not session.isFixed and (session.id in changedIds or not isValidPlacement(context, session, session.day, session.hour))]
+
+
+def getPlacements(context, session, state, affectedIds):
+    # Starts that avoid every placed session the session must not overlap,
+    # all available starts if there are none
+    blockedMasks = [0] * 5
+    semesterMasks = [0] * 5
+    for other in state:
+        if other.id in affectedIds:
+            continue
+        otherMask = getSessionMask(other.hour, other.length)
+        if other.id in context.conflictGraph[session.id]:
+            blockedMasks[other.day] |= otherMask
+        if getSemesterOfSession(other) == getSemesterOfSession(session):
+            semesterMasks[other.day] |= otherMask
+
+    placements = []
+    for day in range(5):
+        freeMask = context.initialAvailableMasks[day] & ~blockedMasks[day] & \
+            ~context.unavailableMasks[context.teacherIndices[session.teacher.id]][day]
+        # Only one of 12.00 and 13.00 may be used on Monday, Tuesday and Thursday
+        if day in [0, 1, 3] and semesterMasks[day] & BREAK_MASK:
+            freeMask &= ~BREAK_MASK
+        placements.extend((day, hour)
+                          for hour in startHours[session.length][freeMask])
+
+    return placements or [(day, hour) for day in range(5)
+                          for hour in startHours[session.length][context.initialAvailableMasks[day]]]
+
+
+def getDistance(position, previousPosition):
+    if previousPosition is None or position[0] != previousPosition[0]:
+        return SLOT_COUNT
+    return abs(position[1] - previousPosition[1])
+
+
+def repairSchedule(context, state, affected, previousPositions):
+    # The affected sessions are placed one after another, the ones with the
+    # fewest placements left first, each at the best scoring of its free
+    # placements and at the one nearest to its previous slot among equals.
+    # The other sessions keep their slots.
+    affectedIds = {session.id for session in affected}
+    for session in affected:
+        if not isValidPlacement(context, session, session.day, session.hour):
+            session.day, session.hour = getPlacements(
+                context, session, state, affectedIds)[0]
+    schedule = Schedule(context, state)
+
+    sessionsById = {session.id: session for session in schedule.state}
+    unplaced = [sessionsById[session.id] for session in affected]
+    while unplaced:
+        placements = {session.id: getPlacements(context, session, schedule.state, affectedIds)
+                      for session in unplaced}
+        session = min(unplaced, key=lambda session: (
+            len(placements[session.id]), -len(context.conflictGraph[session.id])))
+        unplaced.remove(session)
+        affectedIds.remove(session.id)
+
+        candidates = [evolve.tryLocalMove(schedule, [(session, day, hour)])
+                      for day, hour in placements[session.id]]
+        schedule = max(candidates, key=lambda candidate: (
+            candidate.fitness, -getDistance(candidate.positions[session.id], previousPositions.get(session.id))))
+        sessionsById = {session.id: session for session in schedule.state}
+        unplaced = [sessionsById[session.id] for session in unplaced]
+
+    return schedule
+
+
+def restorePreviousPositions(schedule, previousPositions):
+    # Sessions the search moved go back to their previous slot wherever that
+    # does not lower the fitness
+    for sessionId, (day, hour) in previousPositions.items():
+        session = schedule.sessionsById[sessionId]
+        if session.isFixed or (session.day, session.hour) == (day, hour) or \
+                not isValidPlacement(schedule.context, session, day, hour):
+            continue
+        candidate = evolve.tryLocalMove(schedule, [(session, day, hour)])
+        if candidate.fitness >= schedule.fitness:
+            schedule = candidate
+    return schedule
+
+
+def countMovedSessions(schedule, previousPositions):
+    return sum(schedule.positions[sessionId] != position
+               for sessionId, position in previousPositions.items())
+
+
+def perturbSchedule(schedule):
+    for _ in range(schedule.context.WARM_START_MUTATIONS):
+        schedule = createNeighbour(schedule)
+    return schedule
+
+
+def prepareWarmStart(context, previous=None):
+    # Maps a previous Schedule, or the one exported as output/<name>
+    # (WARM_START_SCHEDULE by default), onto the current data and repairs it.
+    # Returns the repaired schedule, the previous slot of every matched
+    # session and the sessions that were placed again.
+    if not isinstance(previous, Schedule):
+        previous = importSchedule(
+            previous or context.WARM_START_SCHEDULE, context=context)
+    state, previousPositions, changedIds = mapPreviousSchedule(
+        context, previous)
+    affected = findAffectedSessions(context, state, changedIds)
+    return repairSchedule(context, state, affected, previousPositions), previousPositions, affected
+
+
+def generateWarmStartSeeds(repaired):
+    context = repaired.context
+    return [repaired] + [perturbSchedule(repaired)
+                         for _ in range(round(context.SIZE * context.WARM_START_RATIO) - 1)]
+
+
+def warmStart(context, previous=None, report=True, history=None):
+    context.resetCaches()
+    time0 = time.time()
+    repaired, previousPositions, affected = prepareWarmStart(context, previous)
+    time1 = time.time()
+
+    if report:
+        print(f'\nWarm start: {len(affected)} sessions placed again, '
+              f'{len(repaired.state) - len(previousPositions)} of them new')
+        print(f'Repaired: {round(repaired.fitness, 2)}', end=' ')
+        print('FEASIBLE') if repaired.isFeasible else print('NON-FEASIBLE')
+
+    if context.ENGINE in ['annealing', 'tabu']:
+        best = trajectorySearch(
+            context, start=repaired, report=False, history=history)
+    else:
+        best = evolve.evolution(
+            context, report=False, seeds=generateWarmStartSeeds(repaired), history=history)
+    if best.fitness < repaired.fitness:
+        best = repaired
+    best = restorePreviousPositions(best, previousPositions)
+    time2 = time.time()
+
+    if report:
+        exportSchedule(
+            best, name=f'{round(best.fitness, 2)}, warm start, {context.SIZE}')
+        print(f'\nWarm start: {round(best.fitness, 2)}, {countMovedSessions(best, previousPositions)} of '
+              f'{len(previousPositions)} sessions moved')
+        print(f'Repair time:\t\t\t{time1-time0}\nSearch total time:\t\t{time2-time1}')
+
+    return best